@@ -0,0 +1,51 @@
+""" Q.StoryOfEveCorp data exporter
+
+Updates the input files of story_of_eve_corp.py straight from a database (SQLite
+is used as a local stand-in for the SeAT database). Queries are read from a file
+in the format of input/example/queries.sql: a comment with the file name before
+each query. queries.sql is written for MySQL/PostgreSQL, use
+input/example/queries-sqlite.sql with a SQLite copy of the SeAT tables.
+
+A query with the :since parameter (for example
+"where date(k.dt) >= :since ... order by k.dt") updates its file incrementally:
+only rows starting from INPUT_DB_OVERLAP_DAYS days before the last exported
+date are fetched, so rows which appear in the database later with older dates
+are exported only by --full. Other files are exported in full every time.
+
+To run this program use following commands from this directory as the root:
+
+$ python db_export.py -d ./seat.sqlite -q ./input/example/queries-sqlite.sql -o ./input -v
+$ python story_of_eve_corp.py -i ./input -o ./output -v
+
+"""
+import argparse
+import sqlite3
+from render_source import DbSource
+
+
+def usage():
+    '''Prints command line'''
+    print('Usage: db_export.py -d database -q queries_file -o output_dir [--full] [-v]')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-d', action="store", dest="database", help='SQLite database file')
+    parser.add_argument('-q', action="store", dest="queries", help='File with queries (see input/example/queries-sqlite.sql)')
+    parser.add_argument('-o', action="store", dest="outdir", help='Output directory for exported files')
+    parser.add_argument('--full', action="store_true", dest="full", help='Export all rows ignoring previous exports')
+    parser.add_argument('-v', action="store_true", dest="verbose", help='Verbose mode')
+
+    args = parser.parse_args()
+
+    if not args.database or not args.queries or not args.outdir:
+        usage()
+        exit(-1)
+
+    connection = sqlite3.connect(args.database)
+    source: DbSource = DbSource(connection, sqlite3.paramstyle, DbSource.read_queries(args.queries), args.outdir)
+    for f_name in source.queries.keys():
+        num: int = source.export(f_name, args.full)
+        if args.verbose:
+            print('{}: {} rows fetched'.format(f_name, num))
+    connection.close()
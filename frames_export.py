@@ -0,0 +1,57 @@
+""" Q.StoryOfEveCorp frames exporter
+
+Exports frames stored by story_of_eve_corp.py in the frames container
+(RENDER_OUTPUT_MODE = RenderOutputMode.CONTAINER) into a PNG sequence or
+feeds them into ffmpeg.
+
+To run this program use following commands from this directory as the root:
+
+$ python frames_export.py -i ./output/frames.sfc -o ./png
+$ python frames_export.py -i ./output/frames.00.sfc -i ./output/frames.01.sfc --ffmpeg ./output/out.mp4
+
+"""
+import os
+import argparse
+import render_settings
+from render_output import ContainerFramesReader, FramesWriter, PngFramesWriter, FfmpegFramesWriter
+
+
+def usage():
+    '''Prints command line'''
+    print('Usage: frames_export.py -i container [-i container...] (-o output_dir | --ffmpeg video_file) [-v]')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-i', action="append", dest="containers", help='Frames container (may be repeated for --jobs output)')
+    parser.add_argument('-o', action="store", dest="outdir", help='Output directory for PNG frames')
+    parser.add_argument('--ffmpeg', action="store", dest="video", help='Video file to encode with ffmpeg')
+    parser.add_argument('-v', action="store_true", dest="verbose", help='Verbose mode')
+
+    args = parser.parse_args()
+
+    if not args.containers or bool(args.outdir) == bool(args.video):
+        usage()
+        exit(-1)
+
+    reader: ContainerFramesReader = ContainerFramesReader(args.containers)
+    # в ffmpeg кадры передаются по порядку, пропуски в нумерации кадров недопустимы (проверяется до запуска ffmpeg,
+    # который сразу же перезаписывает файл видео)
+    indexes = reader.indexes
+    if args.video and indexes != list(range(len(indexes))):
+        print('Frames container has gaps in frames numbering')
+        reader.close()
+        exit(-1)
+    if args.outdir:
+        os.makedirs(args.outdir, exist_ok=True)
+        writer: FramesWriter = PngFramesWriter(args.outdir, render_settings.RENDER_OUTPUT_THREADS, render_settings.RENDER_OUTPUT_QUEUE_SIZE)
+    else:
+        # размер кадров берётся из контейнера (он мог быть записан с другими настройками)
+        writer: FramesWriter = FfmpegFramesWriter(args.video, reader.width, reader.height, render_settings.RENDER_OUTPUT_QUEUE_SIZE)
+    for image_index in indexes:
+        # копия кадра делается только при кодировании (кадр в очереди не должен ссылаться на отображённую память)
+        writer.write(image_index, reader.get_image(image_index))
+    writer.close()
+    if args.verbose:
+        print('Exported {} frames'.format(writer.frames))
+    reader.close()
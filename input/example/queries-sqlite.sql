@@ -0,0 +1,166 @@
+-- SQLite variant of queries.sql for db_export.py: the same SeAT tables are
+-- expected in one SQLite database (without the seat. and qi. schema prefixes).
+-- Differences from queries.sql: || instead of concat(), date() instead of
+-- ::date and timestamp(), integer arithmetic instead of ceil(), and the
+-- :since parameter which makes db_export.py update the files incrementally
+-- (the date must be the first column, rows must be ordered by it).
+
+-- events-utf8.txt
+select e.dt, e.lvl, e.txt
+from (
+  select date(min(enter_time)) dt, 0 lvl, 'Hello, ' || main_pilot_name || ' !' txt
+  from qview_employment_interval
+  group by main_pilot_name
+  union
+  select date(enter_time), 1, pilot_name || ' has come'
+  from qview_employment_interval
+  union
+  select date(gone_time), 2, pilot_name || ' gone'
+  from qview_employment_interval
+  where gone_time is not null
+) e
+where e.dt >= :since
+order by e.dt, e.lvl, e.txt;
+-- 2019-10-01	0	Hello, Samurai Fruitblow !
+-- 2019-10-01	1	Samurai Fruitblow has come
+
+-- killmails-utf8.txt
+select date(k.dt), k.victim, k.ship_type_id, k.mass, k.txt, k.solar_system_id
+from (
+ select
+  d.killmail_time dt,
+  1 victim,
+  v.ship_type_id ship_type_id,
+  t.mass mass,
+  e.main_pilot_name || ' lost ' || t.typename txt,
+  d.solar_system_id solar_system_id
+ from qview_employment_interval e
+   left outer join killmail_victims v on (v.character_id=e.pilot_id)
+   left outer join killmail_details d on (v.killmail_id=d.killmail_id)
+   left outer join invTypes t on (t.typeid=v.ship_type_id)
+ where
+  e.enter_time <= d.killmail_time and
+  (e.gone_time is null or d.killmail_time <= e.gone_time)
+ union
+ select
+  d.killmail_time,
+  0 victim, -- atacker(s)
+  v.ship_type_id,
+  t.mass,
+  case when c.cnt=1 then t.typename || ' destroyed by ' || e.main_pilot_name
+       else t.typename || ' destroyed by ' || c.cnt || ' pilots'
+  end txt,
+  d.solar_system_id
+ from killmail_victims v
+  left outer join killmail_details d on (v.killmail_id=d.killmail_id)
+  left outer join (
+    select killmail_id, min(character_id) character_id
+    from killmail_attackers
+    group by 1) a on (a.killmail_id=v.killmail_id)
+  left outer join (
+    select a1.killmail_id, count(1) cnt, (
+     select count(1)
+     from killmail_attackers a2
+     where a1.killmail_id=a2.killmail_id and a2.corporation_id IN (98677876,98615601,98650099,98553333)
+    ) ri4
+    from killmail_attackers a1
+    group by 1) c on (c.killmail_id=v.killmail_id and c.ri4>0)
+  left outer join qview_employment_interval e on (e.pilot_id=a.character_id)
+  left outer join invTypes t on (t.typeid=v.ship_type_id)
+ where c.ri4 is not null
+) k
+where date(k.dt) >= :since
+order by k.dt, k.victim desc, k.txt;
+-- 2021-09-27	1	28844	960000000	Zorky Graf Tumidus lost Rhea	30000168
+-- 2021-09-27	1	670	32000.0	Zorky Graf Tumidus lost Capsule	30000168
+
+-- industry_jobs-utf8.txt
+select
+ j.dt,
+ j.sum_jobs,
+ j.solar_system_id
+from (
+ select
+  date(j.ecj_start_date) as dt,
+  s.solar_system_id,
+  count(1) sum_jobs
+ from esi_corporation_industry_jobs j
+  left outer join esi_known_stations s on (j.ecj_facility_id=s.location_id)
+ where date(j.ecj_start_date) >= :since
+ group by 1, 2
+) j
+order by 1, 3;
+-- 2019-11-18	2	30004381
+-- 2019-11-18	27	30004391
+
+-- market-utf8.txt
+select
+ w.dt,
+ coalesce(sta.system_id, str.solar_system_id) system_id,
+ w.sum_price
+from (
+ select
+  date(w.date) dt,
+  w.location_id,
+  -- ceil() is not available in every SQLite build
+  cast(sum(w.unit_price * w.quantity) as integer) +
+   (sum(w.unit_price * w.quantity) > cast(sum(w.unit_price * w.quantity) as integer)) sum_price
+ from corporation_wallet_transactions w
+ where corporation_id in (98677876,98615601,98650099,98553333) and date(w.date) >= :since
+ group by 1, 2
+) w
+ left outer join universe_stations sta on (w.location_id=sta.station_id)
+ left outer join universe_structures str on (w.location_id=str.structure_id)
+order by 1, 2;
+-- 2022-02-05	30000142	11631756263
+-- 2022-02-05	30045352	12998000
+
+-- employment_interval-utf8.txt
+select
+ main_pilot_id,
+ pilot_id,
+ main_pilot_name,
+ pilot_name,
+ date(enter_time),
+ date(gone_time)
+from qview_employment_interval
+order by 1, 2;
+-- 93362315	91996495	Burenka Ololoev	Lord Brother Captain	2018-03-24	
+-- 93362315	92932199	Burenka Ololoev	miztrezz	2018-12-18	
+
+-- bounty_prizes-utf8.txt
+select
+ w.dt,
+ w.system_id,
+ w.sum_prizes * 10 -- 10% bounty
+from (
+ select
+  date(w.date) dt,
+  w.context_id as system_id,
+  cast(sum(w.amount) as integer) + (sum(w.amount) > cast(sum(w.amount) as integer)) sum_prizes
+ from corporation_wallet_journals w
+ where corporation_id in (98677876,98615601,98650099,98553333) and w.ref_type='bounty_prizes' and
+  date(w.date) >= :since
+ group by 1, 2
+) w
+order by 1, 2;
+-- 2019-11-08	30004313	24890.0
+-- 2019-11-08	30004391	8550100.0
+
+-- mining-utf8.txt
+select
+ m.date,
+ m.solar_system_id,
+ sum(m.quantity)
+from
+ (select pilot_id, date(enter_time) et, date(gone_time) gt from qview_employment_interval) e
+  inner join character_minings m on (
+   m.character_id=e.pilot_id and
+   e.et<(m.date || ' ' || m.time) and
+   (e.gt is null or (m.date || ' ' || m.time)<e.gt)
+  )
+where m.date >= :since
+group by 1, 2
+order by 1, 2;
+-- 2019-09-27	30000123	1371659
+-- 2019-09-28	30000123	283198
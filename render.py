@@ -1,11 +1,25 @@
 ﻿import typing
-from math import sqrt
-from PIL import Image, ImageDraw, ImageFont, ImageFilter
+from collections import OrderedDict
+from bisect import bisect_left
+from math import sqrt, ceil, floor
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont, ImageFilter, ImageChops
 import datetime
 import csv
+import gzip
+import io
+import mmap
+import functools
+import concurrent.futures
+import os
+import json
+import hashlib
+import pickle
+import zipfile
 
 import eve_sde_tools
 import render_settings
+from render_output import FramesWriter, create_frames_writer
 
 
 class RenderRescale:
@@ -133,28 +147,75 @@ class RenderScale:
         self.fontsize =self.calc_font_size(render_settings.NUMBER_OF_EVENTS)
 
 
+class RenderFadeInTables:
+    def __init__(self):
+        # таблицы прозрачности: значение в позиции n - это прозрачность объекта в n-ом кадре его жизни (начиная с 1),
+        # таблица строится пошаговым уменьшением (увеличением) прозрачности, т.е. теми же операциями над float, что и
+        # прежде в каждом кадре, поэтому значения в точности совпадают; все таблицы хранятся в одном массиве, а объект
+        # помнит смещение и длину своей таблицы
+        self.values: np.ndarray = np.empty(0, dtype=np.float64)
+        self.__tables: typing.Dict[typing.Tuple[str, float], typing.Tuple[int, int]] = {}
+
+    def __add_table(self, key: typing.Tuple[str, float], table: typing.List[float]) -> typing.Tuple[int, int]:
+        found: typing.Tuple[int, int] = (len(self.values), len(table))
+        self.values = np.concatenate((self.values, np.array(table, dtype=np.float64)))
+        self.__tables[key] = found
+        return found
+
+    def get_fading(self, transparency_frame: float) -> typing.Tuple[int, int]:
+        # прозрачность надписей и маркеров, которые гаснут с момента появления
+        found: typing.Optional[typing.Tuple[int, int]] = self.__tables.get(('fading', transparency_frame))
+        if found is not None:
+            return found
+        opacity: float = 1.0
+        table: typing.List[float] = [opacity, opacity]
+        while opacity > 0.0:
+            opacity -= transparency_frame
+            if opacity < 0.0:
+                opacity = 0.0
+            table.append(opacity)
+        return self.__add_table(('fading', transparency_frame), table)
+
+    def get_pulsing(self, transparency_frame: float) -> typing.Tuple[int, int]:
+        # прозрачность маркеров, которые разгораются к середине игровых суток и гаснут к их концу
+        found: typing.Optional[typing.Tuple[int, int]] = self.__tables.get(('pulsing', transparency_frame))
+        if found is not None:
+            return found
+        opacity: float = 0.0
+        table: typing.List[float] = [opacity, opacity]
+        for frame_num in range(2, render_settings.DURATION_DATE + 2):
+            if frame_num < (render_settings.DURATION_DATE + 1) / 2:
+                opacity += transparency_frame
+                if opacity > 1.0:
+                    opacity = 1.0
+            else:
+                opacity -= transparency_frame
+                if opacity < 0.0:
+                    opacity = 0.0
+            table.append(opacity)
+        return self.__add_table(('pulsing', transparency_frame), table)
+
+    def lookup(self, offset, length, frame_num):
+        # после окончания таблицы прозрачность больше не меняется
+        return self.values[offset + np.minimum(frame_num, length - 1)]
+
+
 class RenderFadeInEvent:
     def __init__(self, txt: str, level: int):
         self.txt: str = txt
         self.__color: (int, int, int) = render_settings.EVENTS_SETUP[level][0]
-        self.opacity: float = 1.0
-        self.frame_num: int = 1
         self.lifetime_frames: int = render_settings.EVENTS_SETUP[level][1] * render_settings.RENDER_FRAME_RATE
         self.transparency_frame: float = 1.0 / self.lifetime_frames  # мера прозрачности, добавляемая каждый фрейм
+        # кадр появления надписи и её таблица прозрачности (задаются при добавлении в репозиторий)
+        self.birth_frame: int = 0
+        self.fading: typing.Tuple[int, int] = (0, 0)
 
-    def pass_frame(self):
-        self.frame_num += 1
-        self.opacity -= self.transparency_frame
-        if self.opacity < 0.0:
-            self.opacity = 0.0
-
-    @property
-    def color(self) -> (int, int, int):
-        return int(self.__color[0] * self.opacity), int(self.__color[1] * self.opacity), int(self.__color[2] * self.opacity)
+    def get_color(self, frame: int, tables: RenderFadeInTables) -> (int, int, int):
+        opacity: float = tables.lookup(self.fading[0], self.fading[1], frame - self.birth_frame + 1)
+        return int(self.__color[0] * opacity), int(self.__color[1] * opacity), int(self.__color[2] * opacity)
 
-    @property
-    def disappeared(self) -> bool:
-        return self.frame_num > self.lifetime_frames
+    def is_disappeared(self, frame: int) -> bool:
+        return (frame - self.birth_frame + 1) > self.lifetime_frames
 
 
 class RenderFadeInKillmail:
@@ -187,65 +248,30 @@ class RenderFadeInKillmail:
                 self.__level: int = 2
             else:
                 self.__level: int = 3
-        self.__color: typing.Optional[(int, int, int)] = render_settings.KILLMAILS_SETUP[self.__level][0]
+        self.color: (int, int, int) = render_settings.KILLMAILS_SETUP[self.__level][0]
         self.txt: str = txt
         self.mass: float = ship_mass
         self.x: typing.Optional[float] = x
         self.z: typing.Optional[float] = z
-        self.frame_num: int = 1
+        self.boom_metrix: float = self.__get_boom_metrix()
         map_days: int = render_settings.KILLMAILS_SETUP[self.__level][1]
         self.map_lifetime_frames: int = map_days * render_settings.RENDER_FRAME_RATE
-        self.map_opacity: float = 1.0
         self.map_transparency_frame: float = 1.0 / self.map_lifetime_frames  # мера прозрачности, добавляемая каждый фрейм
         if render_settings.KILLMAILS_SETUP[self.__level][2] is None:
             self.list_lifetime_frames = None
         else:
-            list_days: float = self.__get_boom_metrix()
+            list_days: float = self.boom_metrix
             if list_days < (map_days + 1):
                 list_days = (map_days + 1)
             else:
                 list_days = min(list_days, render_settings.KILLMAILS_SETUP[self.__level][2])
             self.list_lifetime_frames = list_days * render_settings.RENDER_FRAME_RATE
-            self.list_opacity: float = 1.0
             self.list_transparency_frame: float = 1.0 / self.list_lifetime_frames  # мера прозрачности, добавляемая каждый фрейм
 
-    def pass_frame(self):
-        self.frame_num += 1
-        self.map_opacity -= self.map_transparency_frame
-        if self.map_opacity < 0.0:
-            self.map_opacity = 0.0
-        if self.list_lifetime_frames is not None:
-            self.list_opacity -= self.list_transparency_frame
-            if self.list_opacity < 0.0:
-                self.list_opacity = 0.0
-
     @property
     def show_in_list(self) -> bool:
         return self.list_lifetime_frames is not None
 
-    @property
-    def show_on_map(self) -> bool:
-        return self.x is not None and self.frame_num <= self.map_lifetime_frames
-
-    @property
-    def disappeared(self) -> bool:
-        if self.list_lifetime_frames is not None:
-            return self.frame_num > self.list_lifetime_frames or self.list_opacity < 0.08
-        else:
-            return self.frame_num > self.map_lifetime_frames
-
-    @property
-    def list_color(self) -> (int, int, int):
-        return int(self.__color[0] * self.list_opacity), int(self.__color[1] * self.list_opacity), int(self.__color[2] * self.list_opacity)
-
-    @property
-    def map_color(self) -> (int, int, int):
-        return self.__color
-
-    @property
-    def map_alpha(self) -> int:
-        return int(render_settings.KILLMAIL_MAP_MIN_ALPHA + (1.0-self.map_opacity) * (render_settings.KILLMAIL_MAP_MAX_ALPHA - render_settings.KILLMAIL_MAP_MIN_ALPHA))
-
     def __get_boom_metrix(self) -> float:
         # Customs Office  mass = 5'000'000'000  sqrt = 70'710
         # Astrahus        mass = 3'000'000'000  sqrt = 54'772
@@ -256,21 +282,6 @@ class RenderFadeInKillmail:
         boom_metrix: float = sqrt(self.mass) / 1000.0  # раньше было mass / 50000000
         return boom_metrix
 
-    @property
-    def map_radius(self) -> float:
-        # в первые треть игровых суток радиус взрыва растёт, пока на достигнет эквивалента массы
-        # Astrahus 3'000'000'000, Rhea 960'000'000, Capsule 32'000, Venture 1'200'000
-        boom_radius: float = self.__get_boom_metrix()
-        if boom_radius < render_settings.KILLMAIL_MIN_FATNESS:
-            boom_radius = render_settings.KILLMAIL_MIN_FATNESS
-        growing_frames: int = int((render_settings.DURATION_DATE + 1) / 3)
-        if self.frame_num < growing_frames:
-            boom_radius *= self.frame_num / growing_frames
-        # радиус взрыва делаем не меньше чем радиус солнечной системы
-        if boom_radius < render_settings.SOLAR_SYSTEM_FATNESS:
-            boom_radius = render_settings.SOLAR_SYSTEM_FATNESS
-        return boom_radius
-
 
 class RenderFadeInIndustry:
     def __init__(
@@ -281,42 +292,7 @@ class RenderFadeInIndustry:
         self.runs: int = runs
         self.x: typing.Optional[float] = x
         self.z: typing.Optional[float] = z
-        self.frame_num: int = 1
-        self.transparency_frame: float = 2.0 / render_settings.DURATION_DATE  # мера прозрачности, добавляемая каждый фрейм
-        self.opacity: float = 0.0
-
-    def pass_frame(self):
-        self.frame_num += 1
-        if self.frame_num < (render_settings.DURATION_DATE + 1) / 2:
-            self.opacity += self.transparency_frame
-            if self.opacity > 1.0:
-                self.opacity = 1.0
-        else:
-            self.opacity -= self.transparency_frame
-            if self.opacity < 0.0:
-                self.opacity = 0.0
-
-    @property
-    def disappeared(self) -> bool:
-        return self.frame_num > render_settings.DURATION_DATE
-
-    @property
-    def map_color(self) -> (int, int, int):
-        return render_settings.INDUSTRY_SETUP
-
-    @property
-    def map_alpha(self) -> int:
-        return int(render_settings.INDUSTRY_MAP_MIN_ALPHA + (1.0-self.opacity) * (render_settings.INDUSTRY_MAP_MAX_ALPHA - render_settings.INDUSTRY_MAP_MIN_ALPHA))
-
-    @property
-    def map_radius(self) -> float:
-        industry_radius: float = 13 * self.runs / 1000  # 2022-02-02 : 2581 работ
-        half_date_frames: int = int((render_settings.DURATION_DATE + 1) / 2)
-        if self.frame_num < half_date_frames:
-            industry_radius *= self.frame_num / half_date_frames
-        else:
-            industry_radius *= (render_settings.DURATION_DATE - self.frame_num) / half_date_frames
-        return render_settings.INDUSTRY_MIN_FATNESS + industry_radius
+        self.radius: float = 13 * self.runs / 1000  # 2022-02-02 : 2581 работ
 
 
 class RenderFadeInMarket:
@@ -328,42 +304,7 @@ class RenderFadeInMarket:
         self.isk: int = int(isk)
         self.x: typing.Optional[float] = x
         self.z: typing.Optional[float] = z
-        self.frame_num: int = 1
-        self.transparency_frame: float = 2.0 / render_settings.DURATION_DATE  # удвоенная мера прозрачности, добавляемая каждый фрейм
-        self.opacity: float = 0.0
-
-    def pass_frame(self):
-        self.frame_num += 1
-        if self.frame_num < (render_settings.DURATION_DATE + 1) / 2:
-            self.opacity += self.transparency_frame
-            if self.opacity > 1.0:
-                self.opacity = 1.0
-        else:
-            self.opacity -= self.transparency_frame
-            if self.opacity < 0.0:
-                self.opacity = 0.0
-
-    @property
-    def disappeared(self) -> bool:
-        return self.frame_num > render_settings.DURATION_DATE
-
-    @property
-    def map_color(self) -> (int, int, int):
-        return render_settings.MARKET_SETUP
-
-    @property
-    def map_alpha(self) -> int:
-        return int(render_settings.MARKET_MAP_MIN_ALPHA + (1.0-self.opacity) * (render_settings.MARKET_MAP_MAX_ALPHA - render_settings.MARKET_MAP_MIN_ALPHA))
-
-    @property
-    def map_radius(self) -> float:
-        market_radius: float = 13 * self.isk / 20000000000  # 2021-12-09 : 74'161'872'333 isk
-        half_date_frames: int = int((render_settings.DURATION_DATE + 1) / 2)
-        if self.frame_num < half_date_frames:
-            market_radius *= self.frame_num / half_date_frames
-        else:
-            market_radius *= (render_settings.DURATION_DATE - self.frame_num) / half_date_frames
-        return render_settings.MARKET_MIN_FATNESS + market_radius
+        self.radius: float = 13 * self.isk / 20000000000  # 2021-12-09 : 74'161'872'333 isk
 
 
 class RenderFadeInBounty:
@@ -375,42 +316,7 @@ class RenderFadeInBounty:
         self.isk: int = int(isk)
         self.x: typing.Optional[float] = x
         self.z: typing.Optional[float] = z
-        self.frame_num: int = 1
-        self.transparency_frame: float = 2.0 / render_settings.DURATION_DATE  # удвоенная мера прозрачности, добавляемая каждый фрейм
-        self.opacity: float = 0.0
-
-    def pass_frame(self):
-        self.frame_num += 1
-        if self.frame_num < (render_settings.DURATION_DATE + 1) / 2:
-            self.opacity += self.transparency_frame
-            if self.opacity > 1.0:
-                self.opacity = 1.0
-        else:
-            self.opacity -= self.transparency_frame
-            if self.opacity < 0.0:
-                self.opacity = 0.0
-
-    @property
-    def disappeared(self) -> bool:
-        return self.frame_num > render_settings.DURATION_DATE
-
-    @property
-    def map_color(self) -> (int, int, int):
-        return render_settings.BOUNTY_SETUP
-
-    @property
-    def map_alpha(self) -> int:
-        return int(render_settings.BOUNTY_MAP_MIN_ALPHA + (1.0-self.opacity) * (render_settings.BOUNTY_MAP_MAX_ALPHA - render_settings.BOUNTY_MAP_MIN_ALPHA))
-
-    @property
-    def map_radius(self) -> float:
-        bounty_radius: float = 3 * self.isk / 1000000000  # 2020-09-26 : 1'391'764'970 isk
-        half_date_frames: int = int((render_settings.DURATION_DATE + 1) / 2)
-        if self.frame_num < half_date_frames:
-            bounty_radius *= self.frame_num / half_date_frames
-        else:
-            bounty_radius *= (render_settings.DURATION_DATE - self.frame_num) / half_date_frames
-        return render_settings.BOUNTY_MIN_FATNESS + bounty_radius
+        self.radius: float = 3 * self.isk / 1000000000  # 2020-09-26 : 1'391'764'970 isk
 
 
 class RenderFadeInMining:
@@ -422,166 +328,257 @@ class RenderFadeInMining:
         self.quantity: int = int(quantity)
         self.x: typing.Optional[float] = x
         self.z: typing.Optional[float] = z
-        self.frame_num: int = 1
-        self.transparency_frame: float = 2.0 / render_settings.DURATION_DATE  # удвоенная мера прозрачности, добавляемая каждый фрейм
-        self.opacity: float = 0.0
-
-    def pass_frame(self):
-        self.frame_num += 1
-        if self.frame_num < (render_settings.DURATION_DATE + 1) / 2:
-            self.opacity += self.transparency_frame
-            if self.opacity > 1.0:
-                self.opacity = 1.0
-        else:
-            self.opacity -= self.transparency_frame
-            if self.opacity < 0.0:
-                self.opacity = 0.0
-
-    @property
-    def disappeared(self) -> bool:
-        return self.frame_num > render_settings.DURATION_DATE
-
-    @property
-    def map_color(self) -> (int, int, int):
-        return render_settings.MINING_SETUP
+        self.radius: float = 5 * self.quantity / 1000000  # 2021-02-07 : 7'733'427 quantity
+
+
+class RenderFadeInKillmails:
+    def __init__(self, tables: RenderFadeInTables):
+        # killmails хранятся по столбцам (в порядке добавления), так что яркость, время жизни и радиусы маркеров
+        # вычисляются сразу для всех killmails одной операцией над массивом; состояние killmail зависит только от
+        # номера кадра, в котором он появился, и номера текущего кадра
+        self.tables: RenderFadeInTables = tables
+        self.x: np.ndarray = np.empty(0, dtype=np.float64)  # nan, если солнечная система неизвестна
+        self.z: np.ndarray = np.empty(0, dtype=np.float64)
+        self.color: np.ndarray = np.empty((0, 3), dtype=np.int64)
+        self.boom_metrix: np.ndarray = np.empty(0, dtype=np.float64)
+        self.birth_frame: np.ndarray = np.empty(0, dtype=np.int64)
+        self.map_lifetime_frames: np.ndarray = np.empty(0, dtype=np.int64)
+        self.map_fading: np.ndarray = np.empty((0, 2), dtype=np.int64)  # смещение и длина таблицы прозрачности
+        self.list_lifetime_frames: np.ndarray = np.empty(0, dtype=np.float64)  # nan, если в списке не упоминается
+        self.list_fading: np.ndarray = np.empty((0, 2), dtype=np.int64)
+        self.txt: typing.List[str] = []
+        # добавленные за сутки killmails переносятся в массивы разом
+        self.__added: typing.List[typing.Tuple[RenderFadeInKillmail, int]] = []
+
+    def __len__(self) -> int:
+        return len(self.txt) + len(self.__added)
+
+    def add(self, item: RenderFadeInKillmail, frame: int):
+        self.__added.append((item, frame))
+
+    def __flush(self):
+        if not self.__added:
+            return
+        added: typing.List[RenderFadeInKillmail] = [k for (k, _) in self.__added]
+        self.birth_frame = np.concatenate((self.birth_frame, np.array([f for (_, f) in self.__added], dtype=np.int64)))
+        self.__added = []
+        self.x = np.concatenate((self.x, np.array([np.nan if k.x is None else k.x for k in added], dtype=np.float64)))
+        self.z = np.concatenate((self.z, np.array([np.nan if k.z is None else k.z for k in added], dtype=np.float64)))
+        self.color = np.concatenate((self.color, np.array([k.color for k in added], dtype=np.int64)))
+        self.boom_metrix = np.concatenate((self.boom_metrix, np.array([k.boom_metrix for k in added], dtype=np.float64)))
+        self.map_lifetime_frames = np.concatenate((self.map_lifetime_frames, np.array([k.map_lifetime_frames for k in added], dtype=np.int64)))
+        self.map_fading = np.concatenate((self.map_fading, np.array(
+            [self.tables.get_fading(k.map_transparency_frame) for k in added], dtype=np.int64)))
+        self.list_lifetime_frames = np.concatenate((self.list_lifetime_frames, np.array(
+            [k.list_lifetime_frames if k.show_in_list else np.nan for k in added], dtype=np.float64)))
+        self.list_fading = np.concatenate((self.list_fading, np.array(
+            [self.tables.get_fading(k.list_transparency_frame) if k.show_in_list else (0, 1) for k in added], dtype=np.int64)))
+        self.txt.extend(k.txt for k in added)
+
+    def pass_frame(self, frame: int):
+        # удаляем killmails, ставшие практически прозрачными
+        self.__flush()
+        frame_num: np.ndarray = frame - self.birth_frame + 1
+        show_in_list: np.ndarray = ~np.isnan(self.list_lifetime_frames)
+        list_opacity: np.ndarray = self.tables.lookup(self.list_fading[:, 0], self.list_fading[:, 1], frame_num)
+        with np.errstate(invalid='ignore'):
+            disappeared: np.ndarray = np.where(
+                show_in_list,
+                (frame_num > self.list_lifetime_frames) | (list_opacity < 0.08),
+                frame_num > self.map_lifetime_frames)
+        if disappeared.any():
+            alive: np.ndarray = ~disappeared
+            self.x, self.z, self.color, self.boom_metrix = self.x[alive], self.z[alive], self.color[alive], self.boom_metrix[alive]
+            self.birth_frame, self.map_lifetime_frames, self.map_fading = self.birth_frame[alive], self.map_lifetime_frames[alive], self.map_fading[alive]
+            self.list_lifetime_frames, self.list_fading = self.list_lifetime_frames[alive], self.list_fading[alive]
+            self.txt = [t for (t, a) in zip(self.txt, alive) if a]
+
+    def get_list(self, frame: int) -> typing.List[typing.Tuple[str, typing.Tuple[int, int, int]]]:
+        # надписи в списке, начиная с последнего добавленного killmail
+        self.__flush()
+        idx: np.ndarray = np.flatnonzero(~np.isnan(self.list_lifetime_frames))[::-1]
+        list_opacity: np.ndarray = self.tables.lookup(self.list_fading[idx, 0], self.list_fading[idx, 1], frame - self.birth_frame[idx] + 1)
+        color: np.ndarray = (self.color[idx] * list_opacity[:, None]).astype(np.int64)
+        return [(self.txt[i], tuple(c)) for (i, c) in zip(idx.tolist(), color.tolist())]
+
+    def get_markers(self, frame: int) -> (np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray):
+        # маркеры на карте, начиная с последнего добавленного killmail
+        self.__flush()
+        frame_num: np.ndarray = frame - self.birth_frame + 1
+        idx: np.ndarray = np.flatnonzero(~np.isnan(self.x) & (frame_num <= self.map_lifetime_frames))[::-1]
+        frame_num = frame_num[idx]
+        # в первые треть игровых суток радиус взрыва растёт, пока на достигнет эквивалента массы
+        # Astrahus 3'000'000'000, Rhea 960'000'000, Capsule 32'000, Venture 1'200'000
+        boom_radius: np.ndarray = np.maximum(self.boom_metrix[idx], render_settings.KILLMAIL_MIN_FATNESS)
+        growing_frames: int = int((render_settings.DURATION_DATE + 1) / 3)
+        if growing_frames > 0:
+            boom_radius = np.where(frame_num < growing_frames, boom_radius * (frame_num / growing_frames), boom_radius)
+        # радиус взрыва делаем не меньше чем радиус солнечной системы
+        boom_radius = np.maximum(boom_radius, render_settings.SOLAR_SYSTEM_FATNESS)
+        map_opacity: np.ndarray = self.tables.lookup(self.map_fading[idx, 0], self.map_fading[idx, 1], frame_num)
+        alpha: np.ndarray = (render_settings.KILLMAIL_MAP_MIN_ALPHA + (1.0 - map_opacity) * (render_settings.KILLMAIL_MAP_MAX_ALPHA - render_settings.KILLMAIL_MAP_MIN_ALPHA)).astype(np.int64)
+        return self.x[idx], self.z[idx], boom_radius, alpha, self.color[idx]
 
-    @property
-    def map_alpha(self) -> int:
-        return int(render_settings.MINING_MAP_MIN_ALPHA + (1.0-self.opacity) * (render_settings.MINING_MAP_MAX_ALPHA - render_settings.MINING_MAP_MIN_ALPHA))
 
-    @property
-    def map_radius(self) -> float:
-        mining_radius: float = 5 * self.quantity / 1000000  # 2021-02-07 : 7'733'427 quantity
+class RenderFadeInPulses:
+    def __init__(
+            self,
+            tables: RenderFadeInTables,
+            color: (int, int, int),
+            min_alpha: float,
+            max_alpha: float,
+            min_fatness: float):
+        # маркеры производства, торговли, крабства и майнинга появляются в начале игровых суток, разгораются к их
+        # середине и гаснут к их концу; хранятся по столбцам (в порядке добавления), так что вычисляются сразу
+        # для всех маркеров одной операцией над массивом по номеру кадра их появления и номеру текущего кадра
+        self.tables: RenderFadeInTables = tables
+        self.color: (int, int, int) = color
+        self.min_alpha: float = min_alpha
+        self.max_alpha: float = max_alpha
+        self.min_fatness: float = min_fatness
+        # удвоенная мера прозрачности, добавляемая каждый фрейм
+        self.pulsing: typing.Tuple[int, int] = tables.get_pulsing(2.0 / render_settings.DURATION_DATE)
+        self.x: np.ndarray = np.empty(0, dtype=np.float64)  # nan, если солнечная система неизвестна
+        self.z: np.ndarray = np.empty(0, dtype=np.float64)
+        self.radius: np.ndarray = np.empty(0, dtype=np.float64)
+        self.birth_frame: np.ndarray = np.empty(0, dtype=np.int64)
+        # добавленные за сутки маркеры переносятся в массивы разом
+        self.__added: typing.List[typing.Tuple[typing.Any, int]] = []
+
+    def __len__(self) -> int:
+        return len(self.x) + len(self.__added)
+
+    def add(self, item: typing.Any, frame: int):
+        self.__added.append((item, frame))
+
+    def __flush(self):
+        if not self.__added:
+            return
+        added: typing.List[typing.Any] = [i for (i, _) in self.__added]
+        self.birth_frame = np.concatenate((self.birth_frame, np.array([f for (_, f) in self.__added], dtype=np.int64)))
+        self.__added = []
+        self.x = np.concatenate((self.x, np.array([np.nan if i.x is None else i.x for i in added], dtype=np.float64)))
+        self.z = np.concatenate((self.z, np.array([np.nan if i.z is None else i.z for i in added], dtype=np.float64)))
+        self.radius = np.concatenate((self.radius, np.array([i.radius for i in added], dtype=np.float64)))
+
+    def pass_frame(self, frame: int):
+        # удаляем маркеры, ставшие прозрачными
+        self.__flush()
+        alive: np.ndarray = (frame - self.birth_frame + 1) <= render_settings.DURATION_DATE
+        if not alive.all():
+            self.x, self.z, self.radius, self.birth_frame = self.x[alive], self.z[alive], self.radius[alive], self.birth_frame[alive]
+
+    def get_markers(self, frame: int) -> (np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray):
+        self.__flush()
+        idx: np.ndarray = np.flatnonzero(~np.isnan(self.x))
+        frame_num: np.ndarray = frame - self.birth_frame[idx] + 1
         half_date_frames: int = int((render_settings.DURATION_DATE + 1) / 2)
-        if self.frame_num < half_date_frames:
-            mining_radius *= self.frame_num / half_date_frames
-        else:
-            mining_radius *= (render_settings.DURATION_DATE - self.frame_num) / half_date_frames
-        return render_settings.MINING_MIN_FATNESS + mining_radius
+        radius: np.ndarray = self.min_fatness + self.radius[idx] * np.where(
+            frame_num < half_date_frames,
+            frame_num / half_date_frames,
+            (render_settings.DURATION_DATE - frame_num) / half_date_frames)
+        opacity: np.ndarray = self.tables.lookup(self.pulsing[0], self.pulsing[1], frame_num)
+        alpha: np.ndarray = (self.min_alpha + (1.0 - opacity) * (self.max_alpha - self.min_alpha)).astype(np.int64)
+        color: np.ndarray = np.broadcast_to(np.array(self.color, dtype=np.int64), (len(idx), 3))
+        return self.x[idx], self.z[idx], radius, alpha, color
 
 
 class RenderFadeInRegion:
     def __init__(self, region_id: int, color: (int, int, int) = None):
         self.region_id: int = region_id
         self.__color: (int, int, int) = render_settings.REGION_SETUP[0] if not color else color
-        self.opacity: float = 1.0
-        self.frame_num: int = 1
         self.lifetime_frames: int = render_settings.REGION_SETUP[1] * render_settings.RENDER_FRAME_RATE
         self.transparency_frame: float = 1.0 / self.lifetime_frames  # мера прозрачности, добавляемая каждый фрейм
+        # кадр появления надписи и её таблица прозрачности (задаются при добавлении в репозиторий)
+        self.birth_frame: int = 0
+        self.fading: typing.Tuple[int, int] = (0, 0)
 
-    def pass_frame(self):
-        self.frame_num += 1
-        self.opacity -= self.transparency_frame
-        if self.opacity < 0.0:
-            self.opacity = 0.0
-
-    @property
-    def color(self) -> (int, int, int):
-        return int(self.__color[0] * self.opacity), int(self.__color[1] * self.opacity), int(self.__color[2] * self.opacity)
+    def get_color(self, frame: int, tables: RenderFadeInTables) -> (int, int, int):
+        opacity: float = tables.lookup(self.fading[0], self.fading[1], frame - self.birth_frame + 1)
+        return int(self.__color[0] * opacity), int(self.__color[1] * opacity), int(self.__color[2] * opacity)
 
-    @property
-    def disappeared(self) -> bool:
-        return self.frame_num > self.lifetime_frames
+    def is_disappeared(self, frame: int) -> bool:
+        return (frame - self.birth_frame + 1) > self.lifetime_frames
 
 
 class RenderFadeInRepository:
     def __init__(self):
+        # номер текущего кадра, от которого (и от кадра появления) зависит яркость всех надписей и маркеров
+        self.frame: int = 0
+        self.tables: RenderFadeInTables = RenderFadeInTables()
         self.events: typing.List[RenderFadeInEvent] = []
-        self.__killmails: typing.List[RenderFadeInKillmail] = []
-        self.industry: typing.List[RenderFadeInIndustry] = []
-        self.market: typing.List[RenderFadeInMarket] = []
-        self.bounty: typing.List[RenderFadeInBounty] = []
-        self.mining: typing.List[RenderFadeInMining] = []
+        self.killmails: RenderFadeInKillmails = RenderFadeInKillmails(self.tables)
+        self.industry: RenderFadeInPulses = RenderFadeInPulses(
+            self.tables,
+            render_settings.INDUSTRY_SETUP,
+            render_settings.INDUSTRY_MAP_MIN_ALPHA,
+            render_settings.INDUSTRY_MAP_MAX_ALPHA,
+            render_settings.INDUSTRY_MIN_FATNESS)
+        self.market: RenderFadeInPulses = RenderFadeInPulses(
+            self.tables,
+            render_settings.MARKET_SETUP,
+            render_settings.MARKET_MAP_MIN_ALPHA,
+            render_settings.MARKET_MAP_MAX_ALPHA,
+            render_settings.MARKET_MIN_FATNESS)
+        self.bounty: RenderFadeInPulses = RenderFadeInPulses(
+            self.tables,
+            render_settings.BOUNTY_SETUP,
+            render_settings.BOUNTY_MAP_MIN_ALPHA,
+            render_settings.BOUNTY_MAP_MAX_ALPHA,
+            render_settings.BOUNTY_MIN_FATNESS)
+        self.mining: RenderFadeInPulses = RenderFadeInPulses(
+            self.tables,
+            render_settings.MINING_SETUP,
+            render_settings.MINING_MAP_MIN_ALPHA,
+            render_settings.MINING_MAP_MAX_ALPHA,
+            render_settings.MINING_MIN_FATNESS)
         self.regions: typing.List[RenderFadeInRegion] = []
 
     def add_event(self, item: RenderFadeInEvent):
         if len(self.events) == render_settings.NUMBER_OF_EVENTS:
             del self.events[render_settings.NUMBER_OF_EVENTS-1]
+        item.birth_frame = self.frame
+        item.fading = self.tables.get_fading(item.transparency_frame)
         self.events.insert(0, item)
 
     def add_killmail(self, item: RenderFadeInKillmail):
-        self.__killmails.insert(0, item)
+        self.killmails.add(item, self.frame)
 
     def add_industry(self, item: RenderFadeInIndustry):
-        self.industry.append(item)
+        self.industry.add(item, self.frame)
 
     def add_market(self, item: RenderFadeInMarket):
-        self.market.append(item)
+        self.market.add(item, self.frame)
 
     def add_region(self, item: RenderFadeInRegion):
+        item.birth_frame = self.frame
+        item.fading = self.tables.get_fading(item.transparency_frame)
         self.regions.append(item)
 
     def add_bounty(self, item: RenderFadeInBounty):
-        self.bounty.append(item)
+        self.bounty.add(item, self.frame)
 
     def add_mining(self, item: RenderFadeInMining):
-        self.mining.append(item)
+        self.mining.add(item, self.frame)
 
-    @property
-    def killmails_in_list(self):
-        return [k for k in self.__killmails if k.show_in_list]
+    def get_events(self) -> typing.List[typing.Tuple[str, typing.Tuple[int, int, int]]]:
+        return [(e.txt, e.get_color(self.frame, self.tables)) for e in self.events]
 
-    @property
-    def killmails_on_map(self):
-        return [k for k in self.__killmails if k.show_on_map]
+    def get_regions(self) -> typing.List[typing.Tuple[int, typing.Tuple[int, int, int]]]:
+        return [(r.region_id, r.get_color(self.frame, self.tables)) for r in self.regions]
 
     def pass_frame(self):
-        # уменьшаем яркость events-надписей и удаляем ставшие практически прозрачными
-        list_of_disappeared_events: typing.List[int] = []
-        for (idx, e) in enumerate(self.events):
-            e.pass_frame()
-            if e.disappeared:
-                list_of_disappeared_events.insert(0, idx)
-        for idx in list_of_disappeared_events:
-            del self.events[idx]
-        # уменьшаем яркость killmails-надписей и удаляем ставшие практически прозрачными
-        list_of_disappeared_killmails: typing.List[int] = []
-        for (idx, k) in enumerate(self.__killmails):
-            k.pass_frame()
-            if k.disappeared:
-                list_of_disappeared_killmails.insert(0, idx)
-        for idx in list_of_disappeared_killmails:
-            del self.__killmails[idx]
-        # уменьшаем яркость industry-надписей и удаляем ставшие практически прозрачными
-        list_of_disappeared_industry: typing.List[int] = []
-        for (idx, i) in enumerate(self.industry):
-            i.pass_frame()
-            if i.disappeared:
-                list_of_disappeared_industry.insert(0, idx)
-        for idx in list_of_disappeared_industry:
-            del self.industry[idx]
-        # уменьшаем яркость market-надписей и удаляем ставшие практически прозрачными
-        list_of_disappeared_market: typing.List[int] = []
-        for (idx, m) in enumerate(self.market):
-            m.pass_frame()
-            if m.disappeared:
-                list_of_disappeared_market.insert(0, idx)
-        for idx in list_of_disappeared_market:
-            del self.market[idx]
-        # уменьшаем яркость bounty-надписей и удаляем ставшие практически прозрачными
-        list_of_disappeared_bounty: typing.List[int] = []
-        for (idx, b) in enumerate(self.bounty):
-            b.pass_frame()
-            if b.disappeared:
-                list_of_disappeared_bounty.insert(0, idx)
-        for idx in list_of_disappeared_bounty:
-            del self.bounty[idx]
-        # уменьшаем яркость mining-надписей и удаляем ставшие практически прозрачными
-        list_of_disappeared_mining: typing.List[int] = []
-        for (idx, m) in enumerate(self.mining):
-            m.pass_frame()
-            if m.disappeared:
-                list_of_disappeared_mining.insert(0, idx)
-        for idx in list_of_disappeared_mining:
-            del self.mining[idx]
-        # уменьшаем яркость region-надписей и удаляем ставшие практически прозрачными
-        list_of_disappeared_regions: typing.List[int] = []
-        for (idx, r) in enumerate(self.regions):
-            r.pass_frame()
-            if r.disappeared:
-                list_of_disappeared_regions.insert(0, idx)
-        for idx in list_of_disappeared_regions:
-            del self.regions[idx]
+        self.frame += 1
+        # удаляем ставшие практически прозрачными events-надписи (их не больше NUMBER_OF_EVENTS)
+        self.events = [e for e in self.events if not e.is_disappeared(self.frame)]
+        # удаляем ставшие практически прозрачными killmails и маркеры на карте
+        self.killmails.pass_frame(self.frame)
+        self.industry.pass_frame(self.frame)
+        self.market.pass_frame(self.frame)
+        self.bounty.pass_frame(self.frame)
+        self.mining.pass_frame(self.frame)
+        # удаляем ставшие практически прозрачными region-надписи
+        self.regions = [r for r in self.regions if not r.is_disappeared(self.frame)]
 
 
 class RenderPilots:
@@ -618,6 +615,445 @@ class RenderPilots:
         self.contour_img_4th.putalpha(0xcc)
         # коллекция пилотов (их идентификаторов) для отслеживания активности в корпорации
         self.pilots: typing.List[typing.Any] = employment_with_dates
+        # индекс интервалов: между соседними датами входа/выхода пилотов (а также в каждую из этих дат) состав
+        # корпорации не меняется, так что дата отображается в номер такой эпохи двоичным поиском
+        self.change_dates: typing.List[datetime.datetime] = sorted(
+            set(p.enter_date for p in self.pilots) | set(p.gone_date for p in self.pilots if p.gone_date is not None))
+        # список пилотов, нарисованный для последней эпохи (иконки неизменного состава + мерцающие иконки)
+        self.__epoch: typing.Optional[int] = None
+        self.__roster: typing.Optional[typing.Tuple[typing.Optional[Image], typing.List[typing.Tuple[bool, int, int]], int]] = None
+        # статистика использования кеша
+        self.hits: int = 0
+        self.misses: int = 0
+
+    def get_epoch(self, render_date: datetime.datetime) -> int:
+        idx: int = bisect_left(self.change_dates, render_date)
+        if idx < len(self.change_dates) and self.change_dates[idx] == render_date:
+            return 2 * idx + 1
+        return 2 * idx
+
+    def get_icons(self, fill: bool, transparency: float) -> Image:
+        if transparency < 0.25:
+            return self.pilot_1st if fill else self.contour_img_1st
+        elif transparency < 0.5:
+            return self.pilot_2nd if fill else self.contour_img_2nd
+        elif transparency < 0.75:
+            return self.pilot_3rd if fill else self.contour_img_3rd
+        else:  # if transparency < 0.8:
+            return self.pilot_4th if fill else self.contour_img_4th
+
+    def get_roster(self, render_date: datetime.datetime, scale: RenderScale) -> \
+            typing.Tuple[typing.Optional[Image], typing.List[typing.Tuple[bool, int, int]], int]:
+        # иконки пилотов, состав которых не меняется, рисуются один раз в слой с прозрачностью, а иконки пилотов,
+        # которые в эту дату входят или выходят из корпорации, запоминаются и рисуются в каждом кадре
+        epoch: int = self.get_epoch(render_date)
+        if self.__epoch == epoch:
+            self.hits += 1
+            return self.__roster
+        self.misses += 1
+        width: int = self.pilot_1st.width + 4
+        height: int = self.pilot_1st.height + 4
+        right_bound: int = scale.right_bound_of_pilots - width
+        # ---
+        x: int = scale.left_bound_of_pilots
+        y: int = scale.top_bound_of_pilots
+        fill_img: Image = self.pilot_img.convert('RGBA')
+        contour_img: Image = self.pilot_contour_img.convert('RGBA')
+        icons: typing.List[typing.Tuple[Image, int, int]] = []
+        fading: typing.List[typing.Tuple[bool, int, int]] = []
+        # ---
+        main_pilot_id: typing.Optional[int] = None
+        for p in self.pilots:
+            main: int = p.main_id
+            enter: datetime.date = p.enter_date
+            gone: typing.Optional[datetime.date] = p.gone_date
+            if enter <= render_date and (gone is None or render_date <= gone):
+                # мерцающие иконки рисуются в каждом кадре, остальные в слое
+                is_fading: bool = enter == render_date or (gone and gone == render_date)
+                # поскольку список отсортированный, то сбрасываем main-пилота как только он меняется
+                if main_pilot_id and main_pilot_id != main:
+                    main_pilot_id = None
+                # рисуем в списке main-пилота (в данном случае важет только идентификатор, сам main в корпу
+                # может войти позже - это зависит от того выбора, который сделал игрок)
+                if main_pilot_id is None:
+                    if is_fading:
+                        fading.append((True, x, y))
+                    else:
+                        icons.append((fill_img, x, y))
+                    main_pilot_id = main
+                    x += width
+                    if x >= right_bound:
+                        x = scale.left_bound_of_pilots
+                        y += height
+                # рисуем в списке twink-пилота (и однократно main-пилота)
+                if is_fading:
+                    fading.append((False, x, y))
+                else:
+                    icons.append((contour_img, x, y))
+                x += width
+                if x >= right_bound:
+                    x = scale.left_bound_of_pilots
+                    y += height
+        # иконки не перекрываются, поэтому копируются в слой вместе с их прозрачностью (наложение слоя на кадр
+        # даёт тот же результат, что и наложение каждой иконки по отдельности)
+        layer: typing.Optional[Image] = None
+        if icons:
+            layer = Image.new('RGBA', (
+                max(i[1] + i[0].width for i in icons) - scale.left_bound_of_pilots,
+                max(i[2] + i[0].height for i in icons) - scale.top_bound_of_pilots), 0)
+            for img, ix, iy in icons:
+                layer.paste(img, (ix - scale.left_bound_of_pilots, iy - scale.top_bound_of_pilots))
+        self.__epoch = epoch
+        self.__roster = (layer, fading, y + height)
+        return self.__roster
+
+
+class RenderLRUCache:
+    def __init__(self, capacity: int):
+        self.capacity: int = capacity
+        self.__items: typing.OrderedDict[typing.Any, typing.Any] = OrderedDict()
+        # статистика использования кеша
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+
+    def __len__(self) -> int:
+        return len(self.__items)
+
+    def get(self, key: typing.Hashable, factory: typing.Callable[[], typing.Any]) -> typing.Any:
+        item = self.__items.get(key)
+        if item is not None:
+            self.hits += 1
+            self.__items.move_to_end(key)
+            return item
+        self.misses += 1
+        item = factory()
+        self.__items[key] = item
+        # вытесняем из кеша элементы, которые дольше всего не использовались
+        while len(self.__items) > self.capacity:
+            self.__items.popitem(last=False)
+            self.evictions += 1
+        return item
+
+    def clear(self):
+        self.__items.clear()
+
+
+class RenderStartupCache:
+    def __init__(self, cwd: str, sde_names: typing.List[str], font_names: typing.List[str]):
+        # результаты подготовки к рендерингу (пропорции карты, размеры шрифтов, порядок звёзд, звёздное небо) зависят
+        # только от настроек, от SDE файлов, шрифтов и от самой программы, поэтому сохраняются в sde_cache и при
+        # повторном запуске загружаются с диска, а не вычисляются заново
+        self.dir: str = '{}/sde_cache'.format(cwd)
+        self.key: str = self.calc_key(
+            [eve_sde_tools.get_converted_name(cwd, nm) for nm in sde_names] + font_names + [os.path.realpath(__file__)])
+        self.__values: typing.Dict[str, typing.Any] = {}
+        self.__modified: bool = False
+        f_name_json: str = self.get_file_name('values.json')
+        if os.path.isfile(f_name_json):
+            with open(f_name_json, 'r', encoding='utf8') as f:
+                self.__values = json.load(f)
+        # статистика использования кеша
+        self.hits: int = 0
+        self.misses: int = 0
+
+    @staticmethod
+    def calc_key(file_names: typing.List[str]) -> str:
+        digest = hashlib.sha1()
+        for name in sorted(nm for nm in dir(render_settings) if nm.isupper()):
+            digest.update('{}={!r}\n'.format(name, getattr(render_settings, name)).encode('utf8'))
+        for f_name in file_names:
+            if os.path.isfile(f_name):
+                with open(f_name, 'rb') as f:
+                    digest.update(f.read())
+            else:
+                digest.update(f_name.encode('utf8'))
+        return digest.hexdigest()[:16]
+
+    def get_file_name(self, name: str) -> str:
+        return '{dir}/.render_{key}_{nm}'.format(dir=self.dir, key=self.key, nm=name)
+
+    def get(self, name: str) -> typing.Any:
+        value = self.__values.get(name)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def put(self, name: str, value: typing.Any):
+        self.__values[name] = value
+        self.__modified = True
+
+    def get_image(self, name: str) -> typing.Optional[Image]:
+        f_name_png: str = self.get_file_name('{}.png'.format(name))
+        if not os.path.isfile(f_name_png):
+            self.misses += 1
+            return None
+        self.hits += 1
+        with Image.open(f_name_png) as img:
+            img.load()
+            return img.copy()
+
+    def put_image(self, name: str, img: Image):
+        if os.path.isdir(self.dir):
+            # файл пишется под временным именем и переименовывается (кеш могут писать параллельно несколько процессов)
+            f_name_png: str = self.get_file_name('{}.png'.format(name))
+            img.save('{}.{}'.format(f_name_png, os.getpid()), format='PNG', compress_level=1)
+            os.replace('{}.{}'.format(f_name_png, os.getpid()), f_name_png)
+
+    def save(self):
+        if not self.__modified or not os.path.isdir(self.dir):
+            return
+        f_name_json: str = self.get_file_name('values.json')
+        with open('{}.{}'.format(f_name_json, os.getpid()), 'wt+', encoding='utf8') as f:
+            f.write(json.dumps(self.__values, indent=1, sort_keys=False))
+        os.replace('{}.{}'.format(f_name_json, os.getpid()), f_name_json)
+        self.__modified = False
+        # удаляем файлы, оставшиеся от прежних настроек
+        prefix: str = '.render_{}_'.format(self.key)
+        for f_name in os.listdir(self.dir):
+            if f_name.startswith('.render_') and not f_name.startswith(prefix):
+                try:
+                    os.remove('{}/{}'.format(self.dir, f_name))
+                except FileNotFoundError:
+                    pass
+
+
+class RenderMarkersCompositor:
+    def __init__(self, scale: RenderScale, rescale: typing.Optional[RenderRescale], masks: RenderLRUCache):
+        self.scale: RenderScale = scale
+        self.rescale: typing.Optional[RenderRescale] = rescale
+        self.masks: RenderLRUCache = masks
+        # маркеры событий в порядке их рисования (позднее добавленные рисуются поверх ранее добавленных)
+        self.x: typing.List[np.ndarray] = []
+        self.z: typing.List[np.ndarray] = []
+        self.radius: typing.List[np.ndarray] = []
+        self.alpha: typing.List[np.ndarray] = []
+        self.color: typing.List[np.ndarray] = []
+        # размер ячеек сетки, по которой определяется, перекрываются ли маркеры
+        self.cell_size: int = 32
+
+    def add(self, x: np.ndarray, z: np.ndarray, radius: np.ndarray, alpha: np.ndarray, color: np.ndarray):
+        if len(x):
+            self.x.append(x)
+            self.z.append(z)
+            self.radius.append(radius)
+            self.alpha.append(alpha)
+            self.color.append(color)
+
+    @staticmethod
+    def get_kernel_key(radius: float, blur_size: int) -> typing.Tuple[int, int, int]:
+        # маска зависит только от целочисленных размеров круга и рамки, которые рассчитываются при его создании,
+        # поэтому ключом кеша являются именно они (радиусы, отличающиеся на доли пикселя, дают одинаковые маски)
+        border_width: int = blur_size + 3
+        return int(radius + 0.99 + border_width), int(2 * radius), blur_size
+
+    @staticmethod
+    def create_kernel(radius: float, blur_size: int) -> typing.Tuple[int, np.ndarray, np.ndarray, np.ndarray]:
+        # ядро маркера: размер спрайта, координаты и непрозрачность (в диапазоне 0..255) ненулевых пикселей маски
+        mask: np.ndarray = np.asarray(
+            RenderUniverse.create_transparent_ellipse(radius, blur_size, 'white', 255).getchannel('A'),
+            dtype=np.uint16)
+        dz, dx = np.nonzero(mask)
+        return mask.shape[0], dz, dx, mask[dz, dx]
+
+    def project(self) -> (np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray):
+        x: np.ndarray = np.concatenate(self.x).astype(np.float64)
+        z: np.ndarray = np.concatenate(self.z).astype(np.float64)
+        fatness: np.ndarray = np.concatenate(self.radius).astype(np.float64)
+        alpha: np.ndarray = np.concatenate(self.alpha).astype(np.uint16)
+        color: np.ndarray = np.concatenate(self.color).astype(np.uint16).reshape((-1, 3))
+        if render_settings.MOVEMENT_MAP_DEBUG or self.rescale is None:
+            x = self.scale.render_center_width + (x - self.scale.universe_center_x) * self.scale.scale_x
+            z = self.scale.render_half_height - (z - self.scale.universe_center_z) * self.scale.scale_z
+        else:
+            fatness = fatness * self.rescale.rescale_x
+            x = self.scale.render_center_width + (x - self.rescale.universe_center_x) * self.rescale.rescale_x * self.scale.scale_x
+            z = self.scale.render_half_height - (z - self.rescale.universe_center_z) * self.rescale.rescale_z * self.scale.scale_z
+            visible: np.ndarray = \
+                (x >= -fatness) & (x <= (render_settings.RENDER_WIDTH + fatness)) & \
+                (z >= -fatness) & (z <= (render_settings.RENDER_HEIGHT + fatness))
+            x, z, fatness, alpha, color = x[visible], z[visible], fatness[visible], alpha[visible], color[visible]
+        return x, z, fatness, alpha, color
+
+    def compose(self, canvas: Image):
+        if not self.x:
+            return
+        x, z, fatness, alpha, color = self.project()
+        if not len(x):
+            return
+        # маркеры одного размера используют общее ядро, поэтому обрабатываются группами
+        groups: typing.Dict[typing.Tuple[int, int, int], typing.List[int]] = {}
+        kernels: typing.Dict[typing.Tuple[int, int, int], typing.Tuple[int, np.ndarray, np.ndarray, np.ndarray]] = {}
+        for (idx, f) in enumerate(fatness):
+            key: typing.Tuple[int, int, int] = self.get_kernel_key(f, 4)
+            if key not in kernels:
+                kernels[key] = self.masks.get(key, functools.partial(self.create_kernel, f, 4))
+                groups[key] = []
+            groups[key].append(idx)
+        sizes: np.ndarray = np.zeros(len(x), dtype=np.int64)
+        for (key, indexes) in groups.items():
+            sizes[indexes] = kernels[key][0]
+        # левый верхний угол спрайта каждого маркера (так же, как при наложении спрайта на изображение)
+        left: np.ndarray = np.trunc(x - sizes / 2).astype(np.int64)
+        top: np.ndarray = np.trunc(z - sizes / 2).astype(np.int64)
+        # работаем только с той частью изображения, которая накрыта маркерами (если она заметно меньше изображения,
+        # иначе вырезать её и накладывать обратно дороже, чем обработать всё изображение)
+        box_left: int = max(0, int(left.min()))
+        box_top: int = max(0, int(top.min()))
+        box_right: int = min(canvas.width, int((left + sizes).max()))
+        box_bottom: int = min(canvas.height, int((top + sizes).max()))
+        if box_left >= box_right or box_top >= box_bottom:
+            return
+        box: Image = canvas
+        if 2 * (box_right - box_left) * (box_bottom - box_top) < canvas.width * canvas.height:
+            box = canvas.crop((box_left, box_top, box_right, box_bottom))
+        else:
+            box_left, box_top, box_right, box_bottom = 0, 0, canvas.width, canvas.height
+        width: int = box_right - box_left
+        height: int = box_bottom - box_top
+        left -= box_left
+        top -= box_top
+        # маркеры раскладываются по слоям: маркеры одного слоя не перекрываются, а маркер, перекрывающийся с ранее
+        # добавленными маркерами, попадает в слой выше всех их слоёв; тогда слои, наложенные по порядку, дают то же
+        # изображение, что и маркеры, наложенные по одному в порядке добавления, а внутри слоя все маркеры (одного
+        # размера) накладываются за один проход
+        layer: np.ndarray = self.get_layers(left, top, sizes, width, height)
+        # пиксели изображения выгружаются в формате RGBX (так их хранит PIL), каналы - срезы этого буфера, пиксели
+        # маркеров выбираются из них по индексам; смешивание выполняется в целых числах: произведения
+        # непрозрачности (0..255) и цвета укладываются в uint16
+        # буфер переиспользуется от кадра к кадру (выделение памяти под него обходится дороже его заполнения)
+        buffer: np.ndarray = self.masks.get(
+            ('pixels', canvas.width, canvas.height),
+            lambda: np.empty(canvas.width * canvas.height * 4, dtype=np.uint8))
+        pixels: np.ndarray = buffer[:width * height * 4]
+        np.copyto(pixels, np.frombuffer(box.tobytes('raw', 'RGBX'), dtype=np.uint8))
+        pixels = pixels.reshape((-1, 4))
+        planes: typing.List[np.ndarray] = [pixels[:, ch] for ch in range(3)]
+        inside: np.ndarray = (left >= 0) & (top >= 0) & ((left + sizes) <= width) & ((top + sizes) <= height)
+        kernel_keys: typing.List[typing.Tuple[int, int, int]] = list(groups.keys())
+        kernel_index: np.ndarray = np.zeros(len(x), dtype=np.int64)
+        for (idx, key) in enumerate(kernel_keys):
+            kernel_index[groups[key]] = idx
+        order: np.ndarray = np.lexsort((kernel_index, layer))
+        bounds: np.ndarray = np.flatnonzero(
+            (np.diff(layer[order]) != 0) | (np.diff(kernel_index[order]) != 0)) + 1
+        for group in np.split(order, bounds):
+            size, dz, dx, weights = kernels[kernel_keys[kernel_index[group[0]]]]
+            # у маркеров, целиком попадающих на изображение, индексы пикселей - это сдвиги ядра от угла спрайта
+            g: np.ndarray = group[inside[group]]
+            if len(g):
+                flat: np.ndarray = (top[g] * width + left[g])[:, None] + (dz * width + dx)[None, :]
+                opacity: np.ndarray = (weights[None, :] * alpha[g, None] + 127) // 255
+                self.blend(planes, flat, opacity, color[g].T[:, :, None])
+            # у маркеров на краю изображения пиксели, выходящие за его пределы, отбрасываются
+            g = group[~inside[group]]
+            if len(g):
+                px: np.ndarray = left[g, None] + dx[None, :]
+                pz: np.ndarray = top[g, None] + dz[None, :]
+                visible: np.ndarray = (px >= 0) & (px < width) & (pz >= 0) & (pz < height)
+                opacity = (weights[None, :] * alpha[g, None] + 127) // 255
+                rows: np.ndarray = np.broadcast_to(np.arange(len(g))[:, None], px.shape)[visible]
+                self.blend(planes, (pz * width + px)[visible], opacity[visible], color[g][rows].T)
+        box.frombytes(pixels, 'raw', 'RGBX')
+        if box is not canvas:
+            canvas.paste(box, (box_left, box_top))
+
+    @staticmethod
+    def blend(planes: typing.List[np.ndarray], flat: np.ndarray, opacity: np.ndarray, color: np.ndarray):
+        # пиксели с индексами flat не повторяются (маркеры одного слоя не перекрываются)
+        transparency: np.ndarray = 255 - opacity
+        for ch in range(3):
+            planes[ch][flat] = ((color[ch] * opacity + planes[ch][flat] * transparency + 127) // 255).astype(np.uint8)
+
+    def get_layers(self, left: np.ndarray, top: np.ndarray, sizes: np.ndarray, width: int, height: int) -> np.ndarray:
+        # перекрытие маркеров определяется по ячейкам сетки, которые накрывают их спрайты: пары маркер-ячейка
+        # упорядочиваются по ячейкам и номерам маркеров, в каждой ячейке слой маркера должен быть выше слоёв всех
+        # ранее добавленных маркеров этой ячейки
+        col0: np.ndarray = np.clip(left // self.cell_size, 0, (width - 1) // self.cell_size)
+        col1: np.ndarray = np.clip((left + sizes - 1) // self.cell_size, 0, (width - 1) // self.cell_size)
+        row0: np.ndarray = np.clip(top // self.cell_size, 0, (height - 1) // self.cell_size)
+        row1: np.ndarray = np.clip((top + sizes - 1) // self.cell_size, 0, (height - 1) // self.cell_size)
+        cols: int = (width - 1) // self.cell_size + 1
+        ncols: np.ndarray = col1 - col0 + 1
+        nrows: np.ndarray = row1 - row0 + 1
+        counts: np.ndarray = ncols * nrows
+        marker: np.ndarray = np.repeat(np.arange(len(left)), counts)
+        offset: np.ndarray = np.arange(len(marker)) - np.repeat(np.cumsum(counts) - counts, counts)
+        cell: np.ndarray = (row0[marker] + offset // ncols[marker]) * cols + col0[marker] + offset % ncols[marker]
+        order: np.ndarray = np.lexsort((marker, cell))
+        marker, cell = marker[order], cell[order]
+        first: np.ndarray = np.ones(len(cell), dtype=bool)
+        first[1:] = cell[1:] != cell[:-1]
+        starts: np.ndarray = np.flatnonzero(first)
+        # начальное приближение - номер маркера среди маркеров ячейки, далее слои поднимаются, пока в каждой ячейке
+        # слои не станут возрастать в порядке добавления маркеров
+        layer: np.ndarray = np.zeros(len(left), dtype=np.int64)
+        np.maximum.at(layer, marker, np.arange(len(cell)) - np.repeat(starts, np.diff(np.append(starts, len(cell)))))
+        shift: int = len(left) + 1
+        while True:
+            # наибольший слой среди ранее добавленных маркеров ячейки (накопленный максимум по всем ячейкам сразу,
+            # ячейки разделяются сдвигом значений)
+            highest: np.ndarray = np.maximum.accumulate(cell * shift + layer[marker])
+            above: np.ndarray = np.zeros(len(cell), dtype=np.int64)
+            above[1:] = highest[:-1] - cell[1:] * shift + 1
+            above[first] = 0
+            raised: np.ndarray = layer.copy()
+            np.maximum.at(raised, marker, above)
+            if np.array_equal(raised, layer):
+                return layer
+            layer = raised
+
+
+class RenderRegionLabels:
+    def __init__(self, region_font: ImageFont, size_window: int = 4):
+        # при увеличении карты названия регионов рисуются шрифтом размера int(region_font.size * rescale_z), этот
+        # размер и есть шаг масштаба: шрифты и маски надписей хранятся для шагов, близких к текущему, а когда масштаб
+        # уходит дальше size_window шагов, то они выбрасываются
+        self.region_font: ImageFont = region_font
+        self.size_window: int = size_window
+        self.fonts: typing.Dict[int, ImageFont] = {region_font.size: region_font}
+        self.labels: typing.Dict[typing.Tuple[int, int], typing.Tuple[typing.Optional[Image], int, int, float, float]] = {}
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+
+    def get_font(self, size: int) -> ImageFont:
+        font: typing.Optional[ImageFont] = self.fonts.get(size)
+        if font is None:
+            font = ImageFont.truetype(font=self.region_font.path, size=size)
+            self.fonts[size] = font
+            self.evict(size)
+        return font
+
+    def evict(self, size: int):
+        far_sizes: typing.List[int] = [s for s in self.fonts.keys()
+                                       if abs(s - size) > self.size_window and s != self.region_font.size]
+        for s in far_sizes:
+            del self.fonts[s]
+        if far_sizes:
+            far_labels = [k for k in self.labels.keys() if k[1] not in self.fonts]
+            for k in far_labels:
+                del self.labels[k]
+            self.evictions += len(far_labels)
+
+    def get(self, region_id: int, name: str, size: int) -> typing.Tuple[typing.Optional[Image], int, int, float, float]:
+        key: typing.Tuple[int, int] = (region_id, size)
+        label = self.labels.get(key)
+        if label is not None:
+            self.hits += 1
+            return label
+        self.misses += 1
+        font: ImageFont = self.get_font(size)
+        sz: (int, int) = font.getsize(name)
+        mask = RenderUniverse.create_text_mask(name, font, (0, 0))
+        if mask is None:
+            label = (None, 0, 0, sz[0]/2, sz[1]/2)
+        else:
+            label = (mask[0], mask[1], mask[2], sz[0]/2, sz[1]/2)
+        self.labels[key] = label
+        return label
 
 
 class RenderUniverse:
@@ -630,7 +1066,9 @@ class RenderUniverse:
             date_font: ImageFont,
             events_font: ImageFont,
             killmails_font: ImageFont,
-            region_font: ImageFont):
+            region_labels: RenderRegionLabels,
+            sprites: RenderLRUCache,
+            texts: RenderLRUCache):
         self.canvas: Image = canvas
         self.img_draw: ImageDraw = img_draw
         self.scale: RenderScale = scale
@@ -638,7 +1076,9 @@ class RenderUniverse:
         self.date_font: ImageFont = date_font
         self.events_font: ImageFont = events_font
         self.killmails_font: ImageFont = killmails_font
-        self.region_font: ImageFont = region_font
+        self.region_labels: RenderRegionLabels = region_labels
+        self.markers: RenderMarkersCompositor = RenderMarkersCompositor(scale, rescale, sprites)
+        self.texts: RenderLRUCache = texts
 
     @staticmethod
     def create_transparent_ellipse(radius: float, blur_size: int, color: (int, int, int), alpha: int):
@@ -660,160 +1100,339 @@ class RenderUniverse:
         del mask
         return transp_img
 
-    def draw_solar_system(self, x: float, z: float, __luminosity: float):
-        if render_settings.MOVEMENT_MAP_DEBUG or self.rescale is None:
-            fatness: float = render_settings.SOLAR_SYSTEM_FATNESS
-            x: float = self.scale.render_center_width + (x - self.scale.universe_center_x) * self.scale.scale_x
-            z: float = self.scale.render_half_height - (z - self.scale.universe_center_z) * self.scale.scale_z
-        else:
-            fatness: float = render_settings.SOLAR_SYSTEM_FATNESS * self.rescale.rescale_z
-            x: float = self.scale.render_center_width + (x - self.rescale.universe_center_x) * self.rescale.rescale_x * self.scale.scale_x
-            if x < -fatness or x > (render_settings.RENDER_WIDTH+fatness):
-                return
-            z: float = self.scale.render_half_height - (z - self.rescale.universe_center_z) * self.rescale.rescale_z * self.scale.scale_z
-            if z < -fatness or z > (render_settings.RENDER_HEIGHT+fatness):
-                return
-        luminosity: int = int(render_settings.LUMINOSITY_MIN_BOUND + (sqrt(__luminosity) - self.scale.min_luminosity) * self.scale.scale_luminosity)
-        transp_img: Image = self.create_transparent_ellipse(fatness, render_settings.SOLAR_SYSTEM_BLUR, 'white', luminosity)
-        shift: (int, int) = transp_img.size
-        shift = (int(x - shift[0] / 2), int(z - shift[1] / 2))
-        self.canvas.paste(transp_img, shift, transp_img)
-
-    def highlight_solar_system(self, x: float, z: float, color: (int, int, int), fatness: float, alpha: int):
-        if render_settings.MOVEMENT_MAP_DEBUG or self.rescale is None:
-            x: float = self.scale.render_center_width + (x - self.scale.universe_center_x) * self.scale.scale_x
-            z: float = self.scale.render_half_height - (z - self.scale.universe_center_z) * self.scale.scale_z
-        else:
-            fatness *= self.rescale.rescale_x
-            x: float = self.scale.render_center_width + (x - self.rescale.universe_center_x) * self.rescale.rescale_x * self.scale.scale_x
-            if x < -fatness or x > (render_settings.RENDER_WIDTH+fatness):
-                return
-            z: float = self.scale.render_half_height - (z - self.rescale.universe_center_z) * self.rescale.rescale_z * self.scale.scale_z
-            if z < -fatness or z > (render_settings.RENDER_HEIGHT + fatness):
-                return
-        # DEBUG: print("{}x{} {} {} {}".format(int(x), int(z), color, fatness, alpha))
-        transp_img: Image = self.create_transparent_ellipse(fatness, 4, color, alpha)
-        shift: (int, int) = transp_img.size
-        shift = (int(x - shift[0]/2), int(z - shift[1]/2))
-        self.canvas.paste(transp_img, shift, transp_img)
-        del transp_img
-
-    def draw_events_list(self, events: typing.List[RenderFadeInEvent]):
+    @staticmethod
+    def create_text_mask(txt: str, font: ImageFont, start: (float, float)) -> typing.Optional[typing.Tuple[Image, int, int]]:
+        # рисуем надпись белым цветом на чёрном фоне - это будет маска, через которую надпись наносится любым цветом
+        # (дробная часть координат влияет на растеризацию символов, поэтому учитывается так же, как в ImageDraw.text)
+        left, top, right, bottom = font.getbbox(txt)
+        pad_x, pad_y = max(0, -left), max(0, -top)
+        mask = Image.new('L', (pad_x + right + 1, pad_y + bottom + 1), 0)
+        ImageDraw.Draw(mask).text((pad_x + start[0], pad_y + start[1]), txt, fill=255, font=font)
+        bbox = mask.getbbox()
+        if bbox is None:
+            return None
+        return mask.crop(bbox), bbox[0] - pad_x, bbox[1] - pad_y
+
+    def draw_text(self, xy: (float, float), txt: str, color: (int, int, int), font: ImageFont):
+        # надпись растеризуется один раз, в следующих кадрах используется её маска (меняется лишь цвет надписи)
+        start: (float, float) = (xy[0] - int(xy[0]), xy[1] - int(xy[1]))
+        cached = self.texts.get((font.path, font.size, txt, start), lambda: self.create_text_mask(txt, font, start))
+        if cached is not None:
+            mask, shift_x, shift_y = cached
+            self.canvas.paste(color, (int(xy[0]) + shift_x, int(xy[1]) + shift_y), mask)
+
+    def draw_events_list(self, events: typing.List[typing.Tuple[str, typing.Tuple[int, int, int]]]):
         x: int = self.scale.left_bound_of_events
         if render_settings.RENDER_LAYOUT == render_settings.RenderLayout.MAP_CENTER:
             y: float = self.scale.bottom_bound_of_events - self.scale.fontsize
-            for e in events:
-                self.img_draw.text((x, y), e.txt, fill=e.color, font=self.events_font)
+            for (txt, color) in events:
+                self.draw_text((x, y), txt, color, self.events_font)
                 y -= self.scale.fontsize
         elif render_settings.RENDER_LAYOUT == render_settings.RenderLayout.MAP_RIGHT:
             y: float = self.scale.top_bound_of_events
-            for e in events:
-                self.img_draw.text((x, y), e.txt, fill=e.color, font=self.events_font)
+            for (txt, color) in events:
+                self.draw_text((x, y), txt, color, self.events_font)
                 y += self.scale.fontsize
 
-    def draw_killmails_list(self, killmails: typing.List[RenderFadeInKillmail]):
+    def draw_killmails_list(self, killmails: RenderFadeInKillmails, frame: int):
         __x: int = 0  # self.scale.left_bound_of_events
         __height: float = render_settings.RENDER_HEIGHT - 8
-        for (idx, k) in enumerate(killmails):
+        for (idx, (txt, color)) in enumerate(killmails.get_list(frame)):
             __y: float = __height - idx*__height/render_settings.NUMBER_OF_EVENTS - self.scale.fontsize
             if __y < self.scale.bottom_bound_of_pilots:
                 break
-            self.img_draw.text((__x, __y), k.txt, fill=k.list_color, font=self.events_font)
+            self.draw_text((__x, __y), txt, color, self.events_font)
 
-    def draw_killmails_map(self, killmails: typing.List[RenderFadeInKillmail]):
-        for k in killmails:
-            self.highlight_solar_system(k.x, k.z, k.map_color, k.map_radius, k.map_alpha)
+    def draw_killmails_map(self, killmails: RenderFadeInKillmails, frame: int):
+        self.markers.add(*killmails.get_markers(frame))
 
-    def draw_industry_map(self, industry: typing.List[RenderFadeInIndustry]):
-        for i in industry:
-            if i.x is not None:
-                self.highlight_solar_system(i.x, i.z, i.map_color, i.map_radius, i.map_alpha)
+    def draw_industry_map(self, industry: RenderFadeInPulses, frame: int):
+        self.markers.add(*industry.get_markers(frame))
 
-    def draw_market_map(self, market: typing.List[RenderFadeInMarket]):
-        for m in market:
-            if m.x is not None:
-                self.highlight_solar_system(m.x, m.z, m.map_color, m.map_radius, m.map_alpha)
+    def draw_market_map(self, market: RenderFadeInPulses, frame: int):
+        self.markers.add(*market.get_markers(frame))
 
-    def draw_bounty_map(self, bounty: typing.List[RenderFadeInBounty]):
-        for b in bounty:
-            if b.x is not None:
-                self.highlight_solar_system(b.x, b.z, b.map_color, b.map_radius, b.map_alpha)
+    def draw_bounty_map(self, bounty: RenderFadeInPulses, frame: int):
+        self.markers.add(*bounty.get_markers(frame))
 
-    def draw_mining_map(self, mining: typing.List[RenderFadeInMining]):
-        for m in mining:
-            if m.x is not None:
-                self.highlight_solar_system(m.x, m.z, m.map_color, m.map_radius, m.map_alpha)
+    def draw_mining_map(self, mining: RenderFadeInPulses, frame: int):
+        self.markers.add(*mining.get_markers(frame))
+
+    def draw_markers(self):
+        # маркеры событий, собранные в draw_*_map, накладываются на изображение разом в порядке их добавления
+        self.markers.compose(self.canvas)
 
     def draw_date_caption(self, date: str):
         left: int = self.scale.right_bound_of_date - self.date_font.getsize(date)[0]
         # внизу: top: int = render_settings.RENDER_HEIGHT - self.scale.bottom_bound_of_date - self.scale.fontsize
         top: int = self.scale.top_bound_of_date  # вверху
-        self.img_draw.text((left, top), date, fill=(140, 140, 140), font=self.date_font)
+        self.draw_text((left, top), date, (140, 140, 140), self.date_font)
 
     def draw_pilots(self, pilots: RenderPilots, render_date: datetime.datetime, transparency: float):
-        width: int = pilots.pilot_1st.width + 4
-        height: int = pilots.pilot_1st.height + 4
-        right_bound: int = self.scale.right_bound_of_pilots - width
-        # ---
-        x: int = self.scale.left_bound_of_pilots
-        y: int = self.scale.top_bound_of_pilots
+        layer, fading, bottom = pilots.get_roster(render_date, self.scale)
+        if layer is not None:
+            self.canvas.paste(layer, (self.scale.left_bound_of_pilots, self.scale.top_bound_of_pilots), layer)
+        for fill, x, y in fading:
+            icon: Image = pilots.get_icons(fill, transparency)
+            self.canvas.paste(icon, (x, y), icon)
         # ---
-        main_pilot_id: typing.Optional[int] = None
-        for p in pilots.pilots:
-            main: int = p.main_id
-            enter: datetime.date = p.enter_date
-            gone: typing.Optional[datetime.date] = p.gone_date
-            if enter <= render_date and (gone is None or render_date <= gone):
-                # выбор картинок, которыми будем пользоваться
-                if enter == render_date or (gone and gone == render_date):
-                    if transparency < 0.25:
-                        fill, contour = pilots.pilot_1st, pilots.contour_img_1st
-                    elif transparency < 0.5:
-                        fill, contour = pilots.pilot_2nd, pilots.contour_img_2nd
-                    elif transparency < 0.75:
-                        fill, contour = pilots.pilot_3rd, pilots.contour_img_3rd
-                    else:  # if transparency < 0.8:
-                        fill, contour = pilots.pilot_4th, pilots.contour_img_4th
-                else:
-                    fill, contour = pilots.pilot_img, pilots.pilot_contour_img
-                # поскольку список отсортированный, то сбрасываем main-пилота как только он меняется
-                if main_pilot_id and main_pilot_id != main:
-                    main_pilot_id = None
-                # рисуем в списке main-пилота (в данном случае важет только идентификатор, сам main в корпу
-                # может войти позже - это зависит от того выбора, который сделал игрок)
-                if main_pilot_id is None:
-                    self.canvas.paste(fill, (x, y), fill)
-                    main_pilot_id = main
-                    x += width
-                    if x >= right_bound:
-                        x = self.scale.left_bound_of_pilots
-                        y += height
-                # рисуем в списке twink-пилота (и однократно main-пилота)
-                self.canvas.paste(contour, (x, y), contour)
-                x += width
-                if x >= right_bound:
-                    x = self.scale.left_bound_of_pilots
-                    y += height
-        # ---
-        self.scale.bottom_bound_of_pilots = y + height
+        self.scale.bottom_bound_of_pilots = bottom
         self.scale.top_bound_of_events = self.scale.bottom_bound_of_pilots + 8
 
-    def draw_regions(self, sde_regions: typing.Dict[str, typing.Any], regions: typing.List[RenderFadeInRegion]):
-        for r in regions:
-            sr = sde_regions.get(str(r.region_id))
+    def draw_starfield(self, starfield: Image):
+        # наложение белых кругов звёзд на изображение равносильно операции screen с нарисованным на чёрном фоне
+        # звёздным небом: 255-v' = (255-v)*(255-s)/255
+        self.canvas.paste(ImageChops.screen(self.canvas, starfield))
+
+    def draw_regions(
+            self,
+            sde_regions: typing.Dict[str, typing.Any],
+            regions: typing.List[typing.Tuple[int, typing.Tuple[int, int, int]]],
+            starfield: typing.Optional[Image] = None):
+        # если задано звёздное небо, то канва уже является его копией, а звёзды должны оказаться поверх названий
+        # регионов (как если бы они рисовались после надписей), поэтому названия рисуются на чёрном фоне и
+        # накладываются на звёзды операцией screen только в пределах своих прямоугольников
+        labels: typing.List[typing.Tuple[typing.Tuple[int, int, int], Image, int, int]] = []
+        for (region_id, color) in regions:
+            sr = sde_regions.get(str(region_id))
             if sr is None:
                 continue
             center: (float, float, float) = sr['center']
             if render_settings.MOVEMENT_MAP_DEBUG or self.rescale is None:
                 x: float = self.scale.render_center_width + (center['x'] - self.scale.universe_center_x) * self.scale.scale_x
                 y: float = self.scale.render_half_height - (center['z'] - self.scale.universe_center_z) * self.scale.scale_z
-                region_font = self.region_font
+                size: int = self.region_labels.region_font.size
             else:
                 x: float = self.scale.render_center_width + (center['x'] - self.rescale.universe_center_x) * self.rescale.rescale_x * self.scale.scale_x
                 y: float = self.scale.render_half_height - (center['z'] - self.rescale.universe_center_z) * self.rescale.rescale_z * self.scale.scale_z
-                region_font = ImageFont.truetype(font=self.region_font.path, size=int(self.region_font.size * self.rescale.rescale_z))
-            sz: (int, int) = region_font.getsize(sr['name'])
-            self.img_draw.text((x - sz[0]/2, y - sz[1]/2), sr['name'], fill=r.color, font=region_font)
+                size: int = int(self.region_labels.region_font.size * self.rescale.rescale_z)
+            mask, shift_x, shift_y, half_width, half_height = self.region_labels.get(region_id, sr['name'], size)
+            if mask is None:
+                continue
+            elif starfield is None:
+                self.canvas.paste(color, (int(x - half_width) + shift_x, int(y - half_height) + shift_y), mask)
+            else:
+                labels.append((color, mask, int(x - half_width) + shift_x, int(y - half_height) + shift_y))
+        for (idx, (_, mask, left, top)) in enumerate(labels):
+            box = (max(left, 0), max(top, 0),
+                   min(left + mask.width, render_settings.RENDER_WIDTH), min(top + mask.height, render_settings.RENDER_HEIGHT))
+            if box[0] >= box[2] or box[1] >= box[3]:
+                continue
+            # в прямоугольник надписи попадают и пересекающиеся с ним ранее нарисованные надписи, так что пиксель
+            # получает то же значение, что и при наложении звёзд на все надписи разом
+            layer: Image = Image.new('RGB', (box[2] - box[0], box[3] - box[1]), 'black')
+            for (color_other, mask_other, left_other, top_other) in labels[:idx + 1]:
+                if left_other < box[2] and top_other < box[3] and \
+                        (left_other + mask_other.width) > box[0] and (top_other + mask_other.height) > box[1]:
+                    layer.paste(color_other, (left_other - box[0], top_other - box[1]), mask_other)
+            self.canvas.paste(ImageChops.screen(layer, starfield.crop(box)), box[:2])
+
+
+class RenderSolarSystemsGrid:
+    def __init__(self, x: np.ndarray, z: np.ndarray, cells: int = 64):
+        # равномерная сетка над плоскостью x/z: солнечные системы отсортированы по номерам ячеек, так что системы
+        # одной строки сетки, попадающие в диапазон столбцов, лежат в массиве order непрерывным отрезком
+        self.cells: int = cells
+        self.min_x: float = float(x.min()) if len(x) else 0.0
+        self.max_x: float = float(x.max()) if len(x) else 0.0
+        self.min_z: float = float(z.min()) if len(z) else 0.0
+        self.max_z: float = float(z.max()) if len(z) else 0.0
+        self.cell_width: float = (self.max_x - self.min_x) / cells or 1.0
+        self.cell_height: float = (self.max_z - self.min_z) / cells or 1.0
+        col: np.ndarray = np.clip(((x - self.min_x) / self.cell_width).astype(np.int64), 0, cells - 1)
+        row: np.ndarray = np.clip(((z - self.min_z) / self.cell_height).astype(np.int64), 0, cells - 1)
+        cell: np.ndarray = row * cells + col
+        self.order: np.ndarray = np.argsort(cell, kind='stable')
+        self.starts: np.ndarray = np.searchsorted(cell[self.order], np.arange(cells * cells + 1))
+
+    def query(self, min_x: float, max_x: float, min_z: float, max_z: float) -> np.ndarray:
+        # возвращает индексы солнечных систем из ячеек, пересекающихся с прямоугольником (т.е. с некоторым запасом)
+        if max_x < self.min_x or min_x > self.max_x or max_z < self.min_z or min_z > self.max_z:
+            return np.empty(0, dtype=np.int64)
+        col0: int = min(max(int((min_x - self.min_x) // self.cell_width), 0), self.cells - 1)
+        col1: int = min(max(int((max_x - self.min_x) // self.cell_width), 0), self.cells - 1)
+        row0: int = min(max(int((min_z - self.min_z) // self.cell_height), 0), self.cells - 1)
+        row1: int = min(max(int((max_z - self.min_z) // self.cell_height), 0), self.cells - 1)
+        return np.concatenate([
+            self.order[self.starts[row * self.cells + col0]:self.starts[row * self.cells + col1 + 1]]
+            for row in range(row0, row1 + 1)])
+
+
+class RenderStarfieldSplatter:
+    def __init__(self, scale: RenderScale, solar_systems: typing.List[typing.Any]):
+        self.scale: RenderScale = scale
+        # координаты и яркость звёзд хранятся в массивах, с тем чтобы пересчитывать их положение на экране за один
+        # проход сразу для всех солнечных систем
+        self.x: np.ndarray = np.array([p[0] for p in solar_systems], dtype=np.float64)
+        self.z: np.ndarray = np.array([p[2] for p in solar_systems], dtype=np.float64)
+        luminosity: np.ndarray = np.array([p[3] for p in solar_systems], dtype=np.float64)
+        self.alpha: np.ndarray = (render_settings.LUMINOSITY_MIN_BOUND + (np.sqrt(luminosity) - scale.min_luminosity) * scale.scale_luminosity).astype(np.int32)
+        # индекс солнечных систем, с помощью которого при увеличении карты отбираются только видимые звёзды
+        self.grid: RenderSolarSystemsGrid = RenderSolarSystemsGrid(self.x, self.z)
+        # ограничение на кол-во пар звезда-пиксель, обрабатываемых за один проход (ограничивает расход памяти)
+        self.batch_pixels: int = 4 * 1024 * 1024
+
+    @staticmethod
+    def create_glow_kernel(fatness: float) -> np.ndarray:
+        # ядро свечения звезды - это прозрачность размытого круга максимальной яркости (в диапазоне 0..1)
+        transp_img: Image = RenderUniverse.create_transparent_ellipse(fatness, render_settings.SOLAR_SYSTEM_BLUR, 'white', 255)
+        return np.asarray(transp_img.getchannel('A'), dtype=np.float64) / 255.0
+
+    def project(self, rescale: typing.Optional[RenderRescale]) -> (np.ndarray, np.ndarray, np.ndarray, float):
+        if render_settings.MOVEMENT_MAP_DEBUG or rescale is None:
+            fatness: float = render_settings.SOLAR_SYSTEM_FATNESS
+            x: np.ndarray = self.scale.render_center_width + (self.x - self.scale.universe_center_x) * self.scale.scale_x
+            z: np.ndarray = self.scale.render_half_height - (self.z - self.scale.universe_center_z) * self.scale.scale_z
+            alpha: np.ndarray = self.alpha
+        else:
+            fatness: float = render_settings.SOLAR_SYSTEM_FATNESS * rescale.rescale_z
+            # видимая область карты (с запасом на размер звезды) в координатах вселенной, отбираем по сетке только
+            # те солнечные системы, которые могут оказаться на экране
+            scale_x: float = rescale.rescale_x * self.scale.scale_x
+            scale_z: float = rescale.rescale_z * self.scale.scale_z
+            margin: float = fatness + 1
+            candidates: np.ndarray = self.grid.query(
+                rescale.universe_center_x + (-margin - self.scale.render_center_width) / scale_x,
+                rescale.universe_center_x + (render_settings.RENDER_WIDTH + margin - self.scale.render_center_width) / scale_x,
+                rescale.universe_center_z + (self.scale.render_half_height - render_settings.RENDER_HEIGHT - margin) / scale_z,
+                rescale.universe_center_z + (self.scale.render_half_height + margin) / scale_z)
+            x: np.ndarray = self.scale.render_center_width + (self.x[candidates] - rescale.universe_center_x) * rescale.rescale_x * self.scale.scale_x
+            z: np.ndarray = self.scale.render_half_height - (self.z[candidates] - rescale.universe_center_z) * rescale.rescale_z * self.scale.scale_z
+            visible: np.ndarray = \
+                (x >= -fatness) & (x <= (render_settings.RENDER_WIDTH + fatness)) & \
+                (z >= -fatness) & (z <= (render_settings.RENDER_HEIGHT + fatness))
+            x, z, alpha = x[visible], z[visible], self.alpha[candidates][visible]
+        return x, z, alpha, fatness
+
+    def splat(self, x: np.ndarray, z: np.ndarray, alpha: np.ndarray, fatness: float, width: int, height: int) -> np.ndarray:
+        kernel: np.ndarray = self.create_glow_kernel(fatness)
+        # левый верхний угол спрайта каждой звезды (так же, как при наложении спрайта на изображение)
+        left: np.ndarray = np.trunc(x - kernel.shape[1] / 2).astype(np.int64)
+        top: np.ndarray = np.trunc(z - kernel.shape[0] / 2).astype(np.int64)
+        # в расчётах участвуют только ненулевые пиксели ядра
+        dz, dx = np.nonzero(kernel)
+        weights: np.ndarray = kernel[dz, dx]
+        # наложение белого цвета с прозрачностью a на пиксель v даёт 255-v' = (255-v)*(1-a), т.е. результат наложения
+        # любого кол-ва звёзд не зависит от порядка их рисования и равен 255*(1-П(1-a)), поэтому произведение
+        # считается суммой логарифмов, которые накапливаются для всех звёзд разом (изображение обрабатывается
+        # горизонтальными полосами, чтобы ограничить расход памяти на больших изображениях)
+        luminosity: np.ndarray = np.zeros((height, width), dtype=np.uint8)
+        band: int = max(1, self.batch_pixels // width)
+        for band_top in range(0, height, band):
+            band_height: int = min(band, height - band_top)
+            in_band: np.ndarray = (top < (band_top + band_height)) & ((top + kernel.shape[0]) > band_top)
+            band_left, band_alpha = left[in_band], alpha[in_band]
+            band_z: np.ndarray = top[in_band] - band_top
+            log_transparency: np.ndarray = np.zeros(width * band_height, dtype=np.float64)
+            batch: int = max(1, self.batch_pixels // max(1, len(weights)))
+            for beg in range(0, len(band_alpha), batch):
+                px: np.ndarray = band_left[beg:beg+batch, None] + dx[None, :]
+                pz: np.ndarray = band_z[beg:beg+batch, None] + dz[None, :]
+                opacity: np.ndarray = weights[None, :] * (band_alpha[beg:beg+batch, None] / 255.0)
+                inside: np.ndarray = (px >= 0) & (px < width) & (pz >= 0) & (pz < band_height)
+                log_transparency += np.bincount(
+                    (pz * width + px)[inside],
+                    weights=np.log(np.maximum(1.0 - opacity[inside], 1e-6)),
+                    minlength=width * band_height)
+            luminosity[band_top:band_top+band_height] = \
+                np.rint(255.0 * (1.0 - np.exp(log_transparency))).reshape((band_height, width))
+        return luminosity
+
+    def draw(self, rescale: typing.Optional[RenderRescale]) -> Image:
+        x, z, alpha, fatness = self.project(rescale)
+        luminosity: np.ndarray = self.splat(x, z, alpha, fatness, render_settings.RENDER_WIDTH, render_settings.RENDER_HEIGHT)
+        return Image.fromarray(luminosity, 'L').convert('RGB')
+
+
+class RenderStarfieldPyramid:
+    def __init__(self, splatter: RenderStarfieldSplatter, levels: typing.List[int], startup: RenderStartupCache):
+        self.splatter: RenderStarfieldSplatter = splatter
+        self.scale: RenderScale = splatter.scale
+        # вся карта заранее рисуется в нескольких увеличенных разрешениях (1x, 2x, 4x...), вместе с разрешением
+        # в той же пропорции увеличиваются и звёзды, так что увеличенная карта получается вырезанием фрагмента
+        # ближайшего уровня и однократным его перемасштабированием
+        self.levels: typing.List[typing.Tuple[int, float, Image]] = []
+        for level in sorted(set(levels)):
+            fatness: float = render_settings.SOLAR_SYSTEM_FATNESS * level
+            padding: float = fatness + render_settings.SOLAR_SYSTEM_BLUR + 4
+            x: np.ndarray = (splatter.x - self.scale.min_x) * self.scale.scale_x * level + padding
+            z: np.ndarray = (self.scale.max_z - splatter.z) * self.scale.scale_z * level + padding
+            width: int = int(self.scale.universe_width * self.scale.scale_x * level + 2 * padding) + 1
+            height: int = int(self.scale.universe_height * self.scale.scale_z * level + 2 * padding) + 1
+            img: typing.Optional[Image] = startup.get_image('starfield_x{}'.format(level))
+            if img is None or img.size != (width, height):
+                img = Image.fromarray(splatter.splat(x, z, splatter.alpha, fatness, width, height), 'L')
+                startup.put_image('starfield_x{}'.format(level), img)
+            self.levels.append((level, padding, img))
+
+    def draw(self, rescale: RenderRescale) -> typing.Optional[Image]:
+        # выбираем наименьший уровень, разрешение которого не меньше требуемого (уменьшение не более чем вдвое), если
+        # карта увеличена сильнее, чем самый подробный уровень, то звёзды придётся рисовать заново
+        found = next((lvl for lvl in self.levels if lvl[0] >= rescale.rescale_z), None)
+        if found is None:
+            return None
+        level, padding, img = found
+        # край пикселя экрана X соответствует краю пикселя уровня u=a*X+c (аналогично для Z), поэтому на экране
+        # отображается прямоугольник [X0,X1)x[Z0,Z1), в пределах которого уровень вырезается и перемасштабируется
+        a: float = level / rescale.rescale_x
+        e: float = level / rescale.rescale_z
+        c: float = (rescale.universe_center_x - self.scale.min_x) * self.scale.scale_x * level + padding - self.scale.render_center_width * a
+        f: float = (self.scale.max_z - rescale.universe_center_z) * self.scale.scale_z * level + padding - self.scale.render_half_height * e
+        x0: int = max(0, ceil(-c / a))
+        x1: int = min(render_settings.RENDER_WIDTH, floor((img.width - c) / a))
+        z0: int = max(0, ceil(-f / e))
+        z1: int = min(render_settings.RENDER_HEIGHT, floor((img.height - f) / e))
+        starfield: Image = Image.new('L', (render_settings.RENDER_WIDTH, render_settings.RENDER_HEIGHT), 0)
+        if x0 < x1 and z0 < z1:
+            box = (
+                max(0.0, a * x0 + c), max(0.0, e * z0 + f),
+                min(float(img.width), a * x1 + c), min(float(img.height), e * z1 + f))
+            starfield.paste(img.resize((x1 - x0, z1 - z0), resample=Image.BILINEAR, box=box), (x0, z0))
+        return starfield.convert('RGB')
+
+
+class RenderStarfieldCache:
+    def __init__(self, scale: RenderScale, solar_systems: typing.List[typing.Any], startup: RenderStartupCache):
+        # звёзды рисуются не по одной, а все разом в numpy-буфере
+        self.splatter: RenderStarfieldSplatter = RenderStarfieldSplatter(scale, solar_systems)
+        self.startup: RenderStartupCache = startup
+        # при увеличении карты звёздное небо получается перемасштабированием заранее нарисованных уровней
+        self.pyramid: typing.Optional[RenderStarfieldPyramid] = None
+        if render_settings.MOVEMENT_MAP_ENABLED and not render_settings.MOVEMENT_MAP_DEBUG and render_settings.STARFIELD_PYRAMID_LEVELS:
+            self.pyramid = RenderStarfieldPyramid(self.splatter, render_settings.STARFIELD_PYRAMID_LEVELS, startup)
+        # звёздное небо, нарисованное для последней видимой области карты (положение центра и масштаб)
+        self.__viewport: typing.Optional[typing.Tuple[float, float, float, float]] = None
+        self.__starfield: typing.Optional[Image] = None
+        # статистика использования кеша
+        self.hits: int = 0
+        self.misses: int = 0
+
+    @staticmethod
+    def get_viewport(rescale: typing.Optional[RenderRescale]) -> typing.Optional[typing.Tuple[float, float, float, float]]:
+        # в отладочном режиме и при неподвижной карте звёзды всегда рисуются без перемасштабирования
+        if render_settings.MOVEMENT_MAP_DEBUG or rescale is None:
+            return None
+        return rescale.universe_center_x, rescale.universe_center_z, rescale.rescale_x, rescale.rescale_z
+
+    def get(self, rescale: typing.Optional[RenderRescale]) -> Image:
+        # звёздное небо перерисовывается только тогда, когда карта сдвинулась или изменила масштаб (во время
+        # "заморозки" карты, а также при отключенном режиме динамического изменения карты, звёзды не перерисовываются)
+        viewport = self.get_viewport(rescale)
+        if self.__starfield is not None and self.__viewport == viewport:
+            self.hits += 1
+        else:
+            self.misses += 1
+            self.__starfield = self.pyramid.draw(rescale) if viewport is not None and self.pyramid is not None else None
+            if self.__starfield is None and viewport is None:
+                # неподвижная карта целиком рисуется одинаково при каждом запуске программы
+                self.__starfield = self.startup.get_image('starfield')
+                if self.__starfield is None:
+                    self.__starfield = self.splatter.draw(rescale)
+                    self.startup.put_image('starfield', self.__starfield)
+            elif self.__starfield is None:
+                self.__starfield = self.splatter.draw(rescale)
+            self.__viewport = viewport
+        return self.__starfield
 
 
 class PlannedMapMovement:
@@ -1089,11 +1708,11 @@ class RenderRegionsActivity:
             self,
             sde_regions,
             sde_pochven, pochven_date: datetime.datetime,
-            killmails_with_dates: typing.List[typing.Any],
-            industry_with_dates: typing.List[typing.Any],
-            market_with_dates: typing.List[typing.Any],
-            bounty_with_dates: typing.List[typing.Any],
-            mining_with_dates: typing.List[typing.Any]):
+            killmails_with_dates: typing.Iterable[typing.Tuple[datetime.datetime, typing.Optional[int]]],
+            industry_with_dates: typing.Iterable[typing.Tuple[datetime.datetime, typing.Optional[int]]],
+            market_with_dates: typing.Iterable[typing.Tuple[datetime.datetime, typing.Optional[int]]],
+            bounty_with_dates: typing.Iterable[typing.Tuple[datetime.datetime, typing.Optional[int]]],
+            mining_with_dates: typing.Iterable[typing.Tuple[datetime.datetime, typing.Optional[int]]]):
         # временные переменные
         last_date = None
         last_solar_system_id = None
@@ -1104,45 +1723,46 @@ class RenderRegionsActivity:
         # перебираем загруженные наборы данных
         for items in (killmails_with_dates, industry_with_dates, market_with_dates, bounty_with_dates, mining_with_dates):
             # пользуемся тем, что в разных сипсках содержатся объекты с одинаковыми атрибутами date и system
-            for item in items:
+            # (перебираются сразу пары значений колонок date и system)
+            for (date, system) in items:
                 # стараемся не повторять одни и те же действия, если не поменялись индексы для поиска
-                if last_date == item.date and last_solar_system_id == item.system:
+                if last_date == date and last_solar_system_id == system:
                     continue
-                if item.date < pochven_date:
+                if date < pochven_date:
                     some_activity_before_patch = True
                 else:
                     some_activity_after_patch = True
                 # поиск ранее добавленной даты в magnifier-список
-                mdt = next((m for m in self.magnifier if m[0] == item.date), None)
+                mdt = next((m for m in self.magnifier if m[0] == date), None)
                 # проверка, что мы знаем идентификатор солнечной системы
-                if item.system is None:
+                if system is None:
                     continue
                 # проверка, что мы знает регион в котором находится эта солнечная система
                 region = None
                 # сначала ищев в пропатченых данных (регион Pochven и изменённые им другие регионы)
-                if item.date >= pochven_date:
+                if date >= pochven_date:
                     for r in sde_pochven.values():
-                        if item.system in r['systems']:
+                        if system in r['systems']:
                             region = r
                             break
                 # если солнечная система в пропатченных данных не была найдена, то ищем в базовом наборе
                 # исходим из того, что данные регионов патчем только МЕНЯЮТСЯ, но не удаляются и не добавляются)
                 if region is None:
                     for r in sde_regions.values():
-                        if item.system in r['systems']:
+                        if system in r['systems']:
                             region = r
                             break
                 if region is None:
                     continue
                 # добавляем (или обновляем) координаты в magnifier-списке
                 if mdt is None:
-                    self.magnifier.append((item.date, {'min': region['min'], 'max': region['max']}))
+                    self.magnifier.append((date, {'min': region['min'], 'max': region['max']}))
                 else:
                     mdt[1]['min'] = eve_sde_tools.get_min_coordinates(mdt[1]['min'], region['min'])
                     mdt[1]['max'] = eve_sde_tools.get_max_coordinates(mdt[1]['max'], region['max'])
                 # запоминаем идентификаторы, по которым вёлся поиск, чтобы не гонять его вхолостую
-                last_date = item.date
-                last_solar_system_id = item.system
+                last_date = date
+                last_solar_system_id = system
         # по умолчанию добавляем в magnifier-набор данных координаты Pochven на дату релиза
         if some_activity_before_patch and some_activity_after_patch:
             mdt = next((m for m in self.magnifier if m[0] == pochven_date), None)
@@ -1330,9 +1950,351 @@ class MapDynamicMovements:
         return self.render_rescale
 
 
+class RenderCheckpoints:
+    def __init__(self, out_dir: str, job: int, jobs: int, keep: int = 2):
+        # на границах суток состояние сцены сохраняется в каталог с кадрами, так что прерванный рендеринг можно
+        # продолжить с последнего сохранённого дня (каждый процесс при --jobs хранит свои контрольные точки)
+        self.out_dir: str = out_dir
+        self.prefix: str = '.checkpoint_{}_{}_'.format(job, jobs)
+        self.keep: int = keep
+
+    def get_file_name(self, image_index: int) -> str:
+        return '{dir}/{prefix}{idx:0>5}.pickle'.format(dir=self.out_dir, prefix=self.prefix, idx=image_index)
+
+    def list_image_indexes(self) -> typing.List[int]:
+        indexes: typing.List[int] = []
+        for f_name in os.listdir(self.out_dir):
+            if f_name.startswith(self.prefix) and f_name.endswith('.pickle'):
+                indexes.append(int(f_name[len(self.prefix):-len('.pickle')]))
+        return sorted(indexes, reverse=True)
+
+    def read_key(self, image_index: int) -> typing.Any:
+        # ключ контрольной точки записан в начале файла отдельно от состояния сцены, так что его можно прочитать,
+        # не загружая всё состояние (у повреждённой контрольной точки ключа нет)
+        f = open(self.get_file_name(image_index), 'rb')
+        try:
+            return pickle.load(f)
+        except (pickle.UnpicklingError, EOFError):
+            return None
+        finally:
+            f.close()
+
+    def save(self, key: typing.Any, image_index: int, state: typing.Dict[str, typing.Any]):
+        f_name: str = self.get_file_name(image_index)
+        f = open('{}.tmp'.format(f_name), 'wb')
+        try:
+            pickle.dump(key, f, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        finally:
+            f.close()
+        os.replace('{}.tmp'.format(f_name), f_name)
+        # удаляем контрольные точки, оставшиеся от рендеринга с другими настройками или входными данными, а также
+        # сделанные дальше текущего кадра (от прежнего рендеринга, продолженного с более ранней точки), из остальных
+        # оставляем несколько последних
+        kept: int = 0
+        for idx in self.list_image_indexes():
+            if idx <= image_index and kept < self.keep and self.read_key(idx) == key:
+                kept += 1
+            else:
+                os.remove(self.get_file_name(idx))
+
+    def load(
+            self,
+            key: typing.Any,
+            first_image_index: int,
+            frames_writer: FramesWriter) -> typing.Optional[typing.Dict[str, typing.Any]]:
+        # выбираем последнюю контрольную точку, сделанную с теми же настройками и входными данными, все кадры до
+        # которой уже есть на диске
+        if not os.path.isdir(self.out_dir):
+            return None
+        for idx in self.list_image_indexes():
+            f = open(self.get_file_name(idx), 'rb')
+            try:
+                if pickle.load(f) != key:
+                    continue
+                state: typing.Dict[str, typing.Any] = pickle.load(f)
+            except (pickle.UnpicklingError, EOFError):
+                # повреждённая (недописанная) контрольная точка пропускается
+                continue
+            finally:
+                f.close()
+            # кадры, записанные до контрольной точки, должны лежать на диске в том виде, в каком их записал рендеринг,
+            # сохранивший эту точку
+            if frames_writer.has_frames(first_image_index, idx, state.get('frames')):
+                return state
+        return None
+
+
 class ImportedData:
-    def __init__(self):
+    # строка загруженной таблицы: атрибуты читаются из колонок таблицы (сохраняет прежний доступ вида item.date)
+    __slots__ = ('table', 'index')
+
+    def __init__(self, table, index: int):
+        self.table = table
+        self.index: int = index
+
+    def __getattr__(self, name: str) -> typing.Any:
+        return self.table.get_value(name, self.index)
+
+
+class ImportedTable:
+    def __init__(
+            self,
+            columns: typing.Dict[str, typing.Any],
+            missing: typing.Dict[str, np.ndarray],
+            length: int):
+        # колонки: числа в типизированных массивах numpy, даты и текст в списках; у числовых колонок с пропусками
+        # есть маска пропущенных значений (такие значения читаются как None)
+        self.columns: typing.Dict[str, typing.Any] = columns
+        self.missing: typing.Dict[str, np.ndarray] = missing
+        # строки удаляются только из начала таблицы (по мере обработки дат), поэтому удаление - это сдвиг начала
+        self.first: int = 0
+        self.last: int = length
+
+    def __len__(self) -> int:
+        return self.last - self.first
+
+    def __getitem__(self, idx: int) -> ImportedData:
+        if idx < 0:
+            idx += len(self)
+        if idx < 0 or idx >= len(self):
+            raise IndexError('imported table index out of range')
+        return ImportedData(self, self.first + idx)
+
+    def __delitem__(self, idx: typing.Union[int, slice]):
+        if isinstance(idx, slice):
+            if idx.start not in (None, 0) or idx.step not in (None, 1):
+                raise IndexError('only leading rows can be deleted from imported table')
+            self.first = min(self.last, self.first + (len(self) if idx.stop is None else idx.stop))
+        elif idx == 0 and len(self):
+            self.first += 1
+        else:
+            raise IndexError('only leading rows can be deleted from imported table')
+
+    def __iter__(self) -> typing.Iterator[ImportedData]:
+        for i in range(self.first, self.last):
+            yield ImportedData(self, i)
+
+    def get_value(self, name: str, index: int) -> typing.Any:
+        column = self.columns[name]
+        if isinstance(column, np.ndarray):
+            missing: typing.Optional[np.ndarray] = self.missing.get(name)
+            if missing is not None and missing[index]:
+                return None
+            return column[index].item()
+        return column[index]
+
+    def get_column(self, name: str) -> typing.Any:
+        # колонка оставшихся строк (без копирования); пропуски в числовых колонках содержат 0
+        return self.columns[name][self.first:self.last]
+
+    def iter_columns(self, *names: str) -> typing.Iterator[typing.Tuple[typing.Any, ...]]:
+        # перебор значений нескольких колонок (пропуски в числовых колонках - None)
+        columns: typing.List[typing.List[typing.Any]] = []
+        for name in names:
+            column = self.get_column(name)
+            if isinstance(column, np.ndarray):
+                column = column.tolist()
+                missing: typing.Optional[np.ndarray] = self.missing.get(name)
+                if missing is not None:
+                    column = [None if m else v for (v, m) in zip(column, missing[self.first:self.last].tolist())]
+            columns.append(column)
+        return zip(*columns)
+
+
+@functools.lru_cache(maxsize=65536)
+def parse_imported_date(val: str) -> typing.Optional[datetime.datetime]:
+    # одни и те же даты повторяются в тысячах строк, поэтому каждая из них разбирается один раз
+    return datetime.datetime.strptime(val, '%Y-%m-%d') if val else None
+
+
+def get_csv_file_name(fname: str) -> str:
+    # выгрузки могут быть сжаты gzip-ом: читается fname.gz, если файла fname нет
+    if not fname.endswith('.gz') and not os.path.isfile(fname) and os.path.isfile('{}.gz'.format(fname)):
+        return '{}.gz'.format(fname)
+    return fname
+
+
+def get_input_files_key(file_names: typing.List[str]) -> typing.Tuple[typing.Tuple[str, int, int], ...]:
+    # входные файлы идентифицируются путём, размером и временем изменения (содержимое файлов не перечитывается)
+    key: typing.List[typing.Tuple[str, int, int]] = []
+    for fname in file_names:
+        fname = get_csv_file_name(fname)
+        if os.path.isfile(fname):
+            st = os.stat(fname)
+            key.append((os.path.realpath(fname), st.st_size, st.st_mtime_ns))
+        else:
+            key.append((fname, -1, -1))
+    return tuple(key)
+
+
+def open_csv_file(fname: str) -> typing.TextIO:
+    fname = get_csv_file_name(fname)
+    if fname.endswith('.gz'):
+        return gzip.open(fname, 'rt', newline='', encoding='utf8')
+    return open(fname, newline='', encoding='utf8')
+
+
+def seek_csv_date(data: mmap.mmap, date: bytes) -> int:
+    # двоичный поиск начала первой строки, дата в первой колонке которой не меньше date (даты в формате YYYY-MM-DD
+    # сравниваются как байты): строки, начинающиеся до lo, имеют меньшую дату, а начинающиеся с hi - не меньшую
+    lo: int = 0
+    hi: int = len(data)
+    while lo < hi:
+        mid: int = (lo + hi) // 2
+        eol: int = data.find(b'\n', mid - 1) if mid > 0 else -1
+        start: int = 0 if mid == 0 else (len(data) if eol < 0 else eol + 1)
+        if start >= hi:
+            hi = mid
+            continue
+        eol = data.find(b'\n', start)
+        end: int = len(data) if eol < 0 else eol
+        tab: int = data.find(b'\t', start, end)
+        if data[start:end if tab < 0 else tab] < date:
+            lo = end + 1 if eol >= 0 else len(data)
+        else:
+            hi = start
+    return lo
+
+
+def open_csv_range(
+        fname: str,
+        file_date_col: int,
+        start_date: typing.Optional[datetime.datetime],
+        stop_date: typing.Optional[datetime.datetime]) -> typing.TextIO:
+    # если файл упорядочен по датам в первой колонке (и не сжат), то он отображается в память и читается только
+    # диапазон строк с заданными датами, найденный двоичным поиском; иначе читается весь файл
+    fname = get_csv_file_name(fname)
+    if not render_settings.INPUT_SORTED_BY_DATE or file_date_col != 0 or fname.endswith('.gz') or \
+            (start_date is None and stop_date is None) or os.path.getsize(fname) == 0:
+        return open_csv_file(fname)
+    with open(fname, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            begin: int = seek_csv_date(data, start_date.strftime('%Y-%m-%d').encode()) if start_date else 0
+            end: int = seek_csv_date(data, (stop_date + datetime.timedelta(days=1)).strftime('%Y-%m-%d').encode()) \
+                if stop_date else len(data)
+            return io.StringIO(data[begin:max(begin, end)].decode('utf8'), newline='')
+
+
+def create_imported_table(
+        rows: typing.List[typing.List[str]],
+        attributes: typing.List[typing.Tuple[str, typing.Type]]) -> ImportedTable:
+    # строки транспонируются в колонки в том виде, в котором задан формат файла
+    columns: typing.Dict[str, typing.Any] = {}
+    missing: typing.Dict[str, np.ndarray] = {}
+    for (idx, a) in enumerate(attributes):
+        values: typing.List[str] = [row[idx] for row in rows]
+        if a[1] == int or a[1] == float:
+            column: np.ndarray = np.array(values, dtype=str)
+            empty: np.ndarray = column == ''
+            if empty.any():
+                column[empty] = '0'
+                missing[a[0]] = empty
+            columns[a[0]] = column.astype(np.int64 if a[1] == int else np.float64)
+        elif a[1] == datetime.datetime:
+            columns[a[0]] = [parse_imported_date(val) for val in values]
+        else:
+            columns[a[0]] = values
+    return ImportedTable(columns, missing, len(rows))
+
+
+def aggregate_imported_table(table: ImportedTable, value: str) -> ImportedTable:
+    # строки с одинаковыми датой и солнечной системой сливаются в одну (значения value, приведённые к int, суммируются,
+    # так что суммы за день не меняются), порядок строк - по первому появлению пары (date, system)
+    groups: typing.Dict[typing.Tuple[datetime.datetime, typing.Optional[int]], int] = {}
+    for (dt, system, val) in table.iter_columns('date', 'system', value):
+        key: typing.Tuple[datetime.datetime, typing.Optional[int]] = (dt, system)
+        groups[key] = groups.get(key, 0) + int(val)
+    missing: typing.Dict[str, np.ndarray] = {}
+    systems_missing: np.ndarray = np.fromiter((k[1] is None for k in groups.keys()), dtype=bool, count=len(groups))
+    if systems_missing.any():
+        missing['system'] = systems_missing
+    columns: typing.Dict[str, typing.Any] = {
+        'date': [k[0] for k in groups.keys()],
+        'system': np.fromiter((k[1] or 0 for k in groups.keys()), dtype=np.int64, count=len(groups)),
+        value: np.fromiter(groups.values(), dtype=np.int64, count=len(groups)),
+    }
+    return ImportedTable(columns, missing, len(groups))
+
+
+def read_csv_file_cache(fname: str, attributes: typing.List[typing.Tuple[str, typing.Type]]) -> typing.Dict[str, np.ndarray]:
+    # разобранный файл целиком хранится рядом с ним в .npz файле колонками: даты - номерами дней (0 - пусто), числа -
+    # типизированными массивами с масками пропусков, текст - строками utf8, разделёнными символом \0; кеш действителен,
+    # пока не изменились путь, размер, время модификации файла и формат его колонок
+    fname = get_csv_file_name(fname)
+    st = os.stat(fname)
+    key: str = json.dumps({
+        'path': os.path.abspath(fname),
+        'size': st.st_size,
+        'mtime': st.st_mtime_ns,
+        'cols': [(a[0], a[1].__name__) for a in attributes]})
+    cache_name: str = '{}.npz'.format(fname)
+    try:
+        with np.load(cache_name, allow_pickle=False) as npz:
+            if str(npz['key']) == key:
+                return {k: npz[k] for k in npz.files}
+    except (OSError, ValueError, KeyError, zipfile.BadZipFile):
         pass
+    with open_csv_file(fname) as f:
+        table: ImportedTable = create_imported_table(list(csv.reader(f, delimiter='\t')), attributes)
+    arrays: typing.Dict[str, np.ndarray] = {'key': np.array(key)}
+    cacheable: bool = True
+    for a in attributes:
+        column = table.columns[a[0]]
+        if a[1] == datetime.datetime:
+            arrays[a[0]] = np.fromiter((dt.toordinal() if dt is not None else 0 for dt in column), dtype=np.int32, count=len(column))
+        elif isinstance(column, np.ndarray):
+            arrays[a[0]] = column
+            if a[0] in table.missing:
+                arrays['{}__missing'.format(a[0])] = table.missing[a[0]]
+        else:
+            text: str = '\0'.join(column)
+            cacheable = cacheable and text.count('\0') == max(0, len(column) - 1)
+            arrays[a[0]] = np.frombuffer(text.encode('utf8'), dtype=np.uint8)
+    # кеш пишется под временным именем и переименовывается (каталог с данными может быть недоступен для записи)
+    if cacheable:
+        try:
+            with open('{}.{}.tmp'.format(cache_name, os.getpid()), 'wb') as f:
+                np.savez(f, **arrays)
+            os.replace('{}.{}.tmp'.format(cache_name, os.getpid()), cache_name)
+        except OSError:
+            if os.path.isfile('{}.{}.tmp'.format(cache_name, os.getpid())):
+                os.remove('{}.{}.tmp'.format(cache_name, os.getpid()))
+    return arrays
+
+
+def create_imported_table_from_cache(
+        arrays: typing.Dict[str, np.ndarray],
+        file_date_col: int,
+        start_date: typing.Optional[datetime.datetime],
+        stop_date: typing.Optional[datetime.datetime],
+        attributes: typing.List[typing.Tuple[str, typing.Type]],
+        preload_early_dates: bool = False) -> ImportedTable:
+    # отбор строк по датам выполняется сразу над колонкой номеров дней
+    dates: np.ndarray = arrays[attributes[file_date_col][0]]
+    keep: np.ndarray = np.ones(len(dates), dtype=bool)
+    if stop_date:
+        keep &= dates <= stop_date.toordinal()
+    if start_date and not preload_early_dates:
+        keep &= dates >= start_date.toordinal()
+    rows: np.ndarray = np.flatnonzero(keep)
+    columns: typing.Dict[str, typing.Any] = {}
+    missing: typing.Dict[str, np.ndarray] = {}
+    for a in attributes:
+        column: np.ndarray = arrays[a[0]]
+        if a[1] == datetime.datetime:
+            days, inverse = np.unique(column[rows], return_inverse=True)
+            dts: typing.List[typing.Optional[datetime.datetime]] = \
+                [datetime.datetime.fromordinal(d) if d else None for d in days.tolist()]
+            columns[a[0]] = [dts[i] for i in inverse.tolist()]
+        elif a[1] == int or a[1] == float:
+            columns[a[0]] = column[rows]
+            if '{}__missing'.format(a[0]) in arrays:
+                missing[a[0]] = arrays['{}__missing'.format(a[0])][rows]
+        else:
+            values: typing.List[str] = column.tobytes().decode('utf8').split('\0') if len(dates) else []
+            columns[a[0]] = [values[i] for i in rows.tolist()]
+    return ImportedTable(columns, missing, len(rows))
 
 
 def read_csv_file(
@@ -1341,12 +2303,19 @@ def read_csv_file(
         start_date: typing.Optional[datetime.datetime],
         stop_date: typing.Optional[datetime.datetime],
         attributes: typing.List[typing.Tuple[str, typing.Type]],
-        preload_early_dates: bool = False) -> typing.List[typing.Any]:
-    list_with_dates: typing.List[ImportedData] = []
-    with open(fname, newline='', encoding='utf8') as f:
+        preload_early_dates: bool = False) -> ImportedTable:
+    # кеш не нужен, если из упорядоченного по датам файла читается только диапазон заданных дат
+    seekable: bool = render_settings.INPUT_SORTED_BY_DATE and file_date_col == 0 and not preload_early_dates and \
+        (start_date is not None or stop_date is not None) and not get_csv_file_name(fname).endswith('.gz')
+    if render_settings.INPUT_CACHE and not seekable:
+        return create_imported_table_from_cache(
+            read_csv_file_cache(fname, attributes),
+            file_date_col, start_date, stop_date, attributes, preload_early_dates)
+    rows: typing.List[typing.List[str]] = []
+    with open_csv_range(fname, file_date_col, None if preload_early_dates else start_date, stop_date) as f:
         reader = csv.reader(f, delimiter='\t')
         for row in reader:
-            dt = datetime.datetime.strptime(row[file_date_col], '%Y-%m-%d')
+            dt = parse_imported_date(row[file_date_col])
             if preload_early_dates:
                 if stop_date and stop_date < dt:
                     continue
@@ -1359,27 +2328,153 @@ def read_csv_file(
                         continue
                 elif stop_date and stop_date < dt:
                     continue
-            # добавление объекта в список в том виде в котором задан формат файла
-            data: ImportedData = ImportedData()
-            for (idx, a) in enumerate(attributes):
-                val: str = row[idx]
-                if a[1] == int:
-                    setattr(data, a[0], int(val) if val else None)
-                elif a[1] == float:
-                    setattr(data, a[0], float(val) if val else None)
-                elif a[1] == datetime.datetime:
-                    if idx == file_date_col:
-                        setattr(data, a[0], dt)
-                    else:
-                        setattr(data, a[0], datetime.datetime.strptime(val, '%Y-%m-%d') if val else None)
-                else:
-                    setattr(data, a[0], val)
-            list_with_dates.append(data)
+            rows.append(row)
+        del reader
+    return create_imported_table(rows, attributes)
+
+
+def read_csv_days(
+        fname: str,
+        file_date_col: int,
+        start_date: typing.Optional[datetime.datetime],
+        stop_date: typing.Optional[datetime.datetime],
+        attributes: typing.List[typing.Tuple[str, typing.Type]],
+        aggregate: typing.Optional[str] = None) -> \
+        typing.Iterator[typing.Tuple[datetime.datetime, ImportedTable]]:
+    # потоковое чтение файла, упорядоченного по датам: строки выдаются по одному дню, так что в памяти находятся
+    # только строки одного дня (а не вся история); если задано aggregate, то строки дня сливаются по солнечным системам
+    rows: typing.List[typing.List[str]] = []
+    day: typing.Optional[datetime.datetime] = None
+    with open_csv_range(fname, file_date_col, start_date, stop_date) as f:
+        reader = csv.reader(f, delimiter='\t')
+        for row in reader:
+            dt = parse_imported_date(row[file_date_col])
+            if start_date and dt < start_date:
+                continue
+            if stop_date and stop_date < dt:
+                break
+            if day != dt:
+                if day is not None:
+                    if dt < day:
+                        raise Exception('File {} is not sorted by dates ({} after {})'.format(fname, dt, day))
+                    table: ImportedTable = create_imported_table(rows, attributes)
+                    yield day, aggregate_imported_table(table, aggregate) if aggregate else table
+                    rows = []
+                day = dt
+            rows.append(row)
+        del reader
+    if rows:
+        table: ImportedTable = create_imported_table(rows, attributes)
+        yield day, aggregate_imported_table(table, aggregate) if aggregate else table
+
+
+def scan_csv_dates(
+        fname: str,
+        file_date_col: int,
+        start_date: typing.Optional[datetime.datetime],
+        stop_date: typing.Optional[datetime.datetime]) -> \
+        typing.Tuple[typing.Optional[datetime.datetime], typing.Optional[datetime.datetime], int]:
+    # первая и последняя даты упорядоченного по датам файла и кол-во строк в заданном диапазоне дат
+    first_date: typing.Optional[datetime.datetime] = None
+    last_date: typing.Optional[datetime.datetime] = None
+    num: int = 0
+    with open_csv_range(fname, file_date_col, start_date, stop_date) as f:
+        reader = csv.reader(f, delimiter='\t')
+        for row in reader:
+            dt = parse_imported_date(row[file_date_col])
+            if start_date and dt < start_date:
+                continue
+            if stop_date and stop_date < dt:
+                break
+            if first_date is None:
+                first_date = dt
+            last_date = dt
+            num += 1
         del reader
-    return list_with_dates
+    return first_date, last_date, num
 
 
-def render_base_image(cwd: str, input_dir: str, out_dir: str, date_from: str, date_to: str, verbose: bool = False):
+class ImportedTimeline:
+    def __init__(self):
+        # строки загруженных таблиц, разложенные по дням: {stream: {date: [row indexes]}}, так что данные "сегодняшнего
+        # дня" находятся по дате сразу, а не выбираются из начала списков
+        self.tables: typing.Dict[str, ImportedTable] = {}
+        self.days: typing.Dict[str, typing.Dict[datetime.datetime, typing.List[int]]] = {}
+        # потоковые данные (файлы упорядочены по датам): {stream: функция, открывающая поток дней}, открытые потоки
+        # и прочитанный из потока день (в памяти хранятся только строки этого дня)
+        self.openers: typing.Dict[str, typing.Callable[[], typing.Iterator[typing.Tuple[datetime.datetime, ImportedTable]]]] = {}
+        self.streams: typing.Dict[str, typing.Iterator[typing.Tuple[datetime.datetime, ImportedTable]]] = {}
+        self.heads: typing.Dict[str, typing.Optional[typing.Tuple[datetime.datetime, ImportedTable]]] = {}
+        self.lengths: typing.Dict[str, int] = {}
+        self.first_date: typing.Optional[datetime.datetime] = None
+        self.last_date: typing.Optional[datetime.datetime] = None
+
+    def __extend_dates(self, first_date: typing.Optional[datetime.datetime], last_date: typing.Optional[datetime.datetime]):
+        if first_date is not None and (self.first_date is None or self.first_date > first_date):
+            self.first_date = first_date
+        if last_date is not None and (self.last_date is None or self.last_date < last_date):
+            self.last_date = last_date
+
+    def add(self, stream: str, table: ImportedTable, date_attribute: str = 'date'):
+        days: typing.Dict[datetime.datetime, typing.List[int]] = {}
+        for (idx, dt) in enumerate(table.get_column(date_attribute), table.first):
+            rows: typing.Optional[typing.List[int]] = days.get(dt)
+            if rows is None:
+                days[dt] = [idx]
+            else:
+                rows.append(idx)
+        self.tables[stream] = table
+        self.days[stream] = days
+        self.lengths[stream] = len(table)
+        if days:
+            self.__extend_dates(min(days.keys()), max(days.keys()))
+
+    def add_stream(
+            self,
+            stream: str,
+            opener: typing.Callable[[], typing.Iterator[typing.Tuple[datetime.datetime, ImportedTable]]],
+            first_date: typing.Optional[datetime.datetime],
+            last_date: typing.Optional[datetime.datetime],
+            length: int):
+        self.openers[stream] = opener
+        self.lengths[stream] = length
+        self.__extend_dates(first_date, last_date)
+
+    def get_rows(self, stream: str, render_date: datetime.datetime) -> typing.Iterator[ImportedData]:
+        if stream in self.openers:
+            # даты запрашиваются по возрастанию, поэтому более ранние дни потока пропускаются и забываются
+            if stream not in self.streams:
+                self.streams[stream] = self.openers[stream]()
+                self.heads[stream] = next(self.streams[stream], None)
+            while self.heads[stream] is not None and self.heads[stream][0] < render_date:
+                self.heads[stream] = next(self.streams[stream], None)
+            head = self.heads[stream]
+            if head is not None and head[0] == render_date:
+                yield from head[1]
+            return
+        table: ImportedTable = self.tables[stream]
+        for idx in self.days[stream].get(render_date, []):
+            yield ImportedData(table, idx)
+
+    def iter_columns(self, stream: str, *names: str) -> typing.Iterator[typing.Tuple[typing.Any, ...]]:
+        # перебор колонок всех строк (потоковые данные для этого читаются отдельным потоком)
+        if stream in self.openers:
+            for (_, table) in self.openers[stream]():
+                yield from table.iter_columns(*names)
+        else:
+            yield from self.tables[stream].iter_columns(*names)
+
+
+def render_base_image(
+        cwd: str,
+        input_dir: str,
+        out_dir: str,
+        date_from: str,
+        date_to: str,
+        verbose: bool = False,
+        job: int = 0,
+        jobs: int = 1,
+        resume: bool = False):
     sde_names = eve_sde_tools.read_converted(cwd, "invNames")
     if verbose:
         print("Read {} names in Universe".format(len(sde_names)))
@@ -1405,9 +2500,20 @@ def render_base_image(cwd: str, input_dir: str, out_dir: str, date_from: str, da
         r['systems'] = systems_as_int
 
     # рассчитываем пропорции и региона на изображении, которые будут использоваться для отрисовки разной информации
+    # пропорции карты, размеры шрифтов и звёздное небо не меняются от запуска к запуску (пока не изменились
+    # настройки или SDE), поэтому берутся из кеша, если он есть
+    startup_cache: RenderStartupCache = RenderStartupCache(
+        cwd,
+        ["fsdUniversePositions"],
+        [ImageFont.truetype("arial.ttf", 10).path])
     render_scale = RenderScale()
-    render_scale.calc(sde_positions)
-    render_scale.choose_font_size()
+    cached_scale: typing.Optional[typing.Dict[str, typing.Any]] = startup_cache.get('scale')
+    if cached_scale is None:
+        render_scale.calc(sde_positions)
+        render_scale.choose_font_size()
+        startup_cache.put('scale', dict(vars(render_scale)))
+    else:
+        vars(render_scale).update(cached_scale)
     if verbose:
         print("Min and max positions:", render_scale.min_x, render_scale.max_x, render_scale.min_z, render_scale.max_z)
         print("Center positions:", render_scale.universe_center_x, render_scale.universe_center_z)
@@ -1424,95 +2530,88 @@ def render_base_image(cwd: str, input_dir: str, out_dir: str, date_from: str, da
             render_settings.LUMINOSITY_MIN_BOUND+(render_scale.max_luminosity-render_scale.min_luminosity)*render_scale.scale_luminosity))
     # настраиваем шрифты, которым будем рисовать события даты и т.п.
     events_font = ImageFont.truetype("arial.ttf", render_scale.fontsize)
-    date_font = ImageFont.truetype("arial.ttf", render_scale.calc_font_size(50))
-    region_font = ImageFont.truetype("arial.ttf", render_scale.calc_font_size(55))
+    cached_font_sizes: typing.Optional[typing.Dict[str, int]] = startup_cache.get('font_sizes')
+    if cached_font_sizes is None:
+        cached_font_sizes = {'date': render_scale.calc_font_size(50), 'region': render_scale.calc_font_size(55)}
+        startup_cache.put('font_sizes', cached_font_sizes)
+    date_font = ImageFont.truetype("arial.ttf", cached_font_sizes['date'])
+    region_font = ImageFont.truetype("arial.ttf", cached_font_sizes['region'])
     # выбор дат для отрисовки сцен
     start_date = datetime.datetime.strptime(date_from, '%Y-%m-%d') if date_from else None
     stop_date = datetime.datetime.strptime(date_to, '%Y-%m-%d') if date_to else None
     pochven_date = datetime.datetime.strptime('2020-10-13', '%Y-%m-%d')
 
-    # читаем данные из файлов
-    events_with_dates = read_csv_file(
-        '{}/{}'.format(input_dir, render_settings.FILE_EVENTS_NAME), render_settings.FILE_EVENTS_COL_DATE,
-        start_date, stop_date,
-        render_settings.FILE_EVENTS_COLS)
-    killmails_with_dates = read_csv_file(
-        '{}/{}'.format(input_dir, render_settings.FILE_KILLMAILS_NAME), render_settings.FILE_KILLMAILS_COL_DATE,
-        start_date, stop_date,
-        render_settings.FILE_KILLMAILS_COLS)
-    industry_with_dates = read_csv_file(
-        '{}/{}'.format(input_dir, render_settings.FILE_INDUSTRY_NAME), render_settings.FILE_INDUSTRY_COL_DATE,
-        start_date, stop_date,
-        render_settings.FILE_INDUSTRY_COLS)
-    market_with_dates = read_csv_file(
-        '{}/{}'.format(input_dir, render_settings.FILE_MARKET_NAME), render_settings.FILE_MARKET_COL_DATE,
-        start_date, stop_date,
-        render_settings.FILE_MARKET_COLS)
-    employment_with_dates = read_csv_file(
-        '{}/{}'.format(input_dir, render_settings.FILE_EMPLOYMENT_NAME), render_settings.FILE_EMPLOYMENT_COL_ENTER_DATE,
-        start_date, stop_date,
-        render_settings.FILE_EMPLOYMENT_COLS,
-        preload_early_dates=True)
-    bounty_with_dates = read_csv_file(
-        '{}/{}'.format(input_dir, render_settings.FILE_BOUNTY_NAME), render_settings.FILE_BOUNTY_COL_DATE,
-        start_date, stop_date,
-        render_settings.FILE_BOUNTY_COLS)
-    mining_with_dates = read_csv_file(
-        '{}/{}'.format(input_dir, render_settings.FILE_MINING_NAME), render_settings.FILE_MINING_COL_DATE,
-        start_date, stop_date,
-        render_settings.FILE_MINING_COLS)
-
-    # определяем начало диапазона, который будет участвовать в создании кадров
-    if start_date:
-        render_date = start_date
+    # читаем данные из файлов, раскладываем их по дням, заодно определяем начало и конец диапазона, который будет
+    # участвовать в создании кадров
+    # рыночные сделки, баунти и майнинг суммируются по (дате, солнечной системе) при загрузке, так что в одной
+    # солнечной системе за день появляется один маркер (см. INPUT_AGGREGATE)
+    aggregate: bool = render_settings.INPUT_AGGREGATE
+    input_files: typing.List[typing.Tuple[str, str, int, typing.List[typing.Tuple[str, typing.Type]], typing.Optional[str]]] = [
+        ('events', render_settings.FILE_EVENTS_NAME, render_settings.FILE_EVENTS_COL_DATE, render_settings.FILE_EVENTS_COLS, None),
+        ('killmails', render_settings.FILE_KILLMAILS_NAME, render_settings.FILE_KILLMAILS_COL_DATE, render_settings.FILE_KILLMAILS_COLS, None),
+        ('industry', render_settings.FILE_INDUSTRY_NAME, render_settings.FILE_INDUSTRY_COL_DATE, render_settings.FILE_INDUSTRY_COLS, None),
+        ('market', render_settings.FILE_MARKET_NAME, render_settings.FILE_MARKET_COL_DATE, render_settings.FILE_MARKET_COLS, 'isk' if aggregate else None),
+        ('bounty', render_settings.FILE_BOUNTY_NAME, render_settings.FILE_BOUNTY_COL_DATE, render_settings.FILE_BOUNTY_COLS, 'isk' if aggregate else None),
+        ('mining', render_settings.FILE_MINING_NAME, render_settings.FILE_MINING_COL_DATE, render_settings.FILE_MINING_COLS, 'quantity' if aggregate else None),
+    ]
+    timeline: ImportedTimeline = ImportedTimeline()
+    # сотрудники корпорации загружаются целиком (включая более ранние даты), т.к. состав корпорации ищется по датам
+    # в RenderPilots, и по дням не раскладываются
+    if render_settings.INPUT_STREAMING:
+        # потоковый режим: файлы упорядочены по датам и читаются по одному дню (только границы дат известны заранее)
+        for (stream, f_name, file_date_col, attributes, value) in input_files:
+            path: str = '{}/{}'.format(input_dir, f_name)
+            timeline.add_stream(
+                stream,
+                functools.partial(read_csv_days, path, file_date_col, start_date, stop_date, attributes, value),
+                *scan_csv_dates(path, file_date_col, start_date, stop_date))
+        employment_with_dates: ImportedTable = read_csv_file(
+            '{}/{}'.format(input_dir, render_settings.FILE_EMPLOYMENT_NAME), render_settings.FILE_EMPLOYMENT_COL_ENTER_DATE,
+            start_date, stop_date,
+            render_settings.FILE_EMPLOYMENT_COLS,
+            preload_early_dates=True)
     else:
-        dts: typing.List[str] = []
-        if events_with_dates:
-            dts.append(events_with_dates[0].date)
-        if killmails_with_dates:
-            dts.append(killmails_with_dates[0].date)
-        if industry_with_dates:
-            dts.append(industry_with_dates[0].date)
-        if market_with_dates:
-            dts.append(market_with_dates[0].date)
-        if bounty_with_dates:
-            dts.append(bounty_with_dates[0].date)
-        if mining_with_dates:
-            dts.append(mining_with_dates[0].date)
-        render_date = None
-        for dt in dts:
-            if render_date is None or render_date > dt:
-                render_date = dt
-    # определяем конец диапазона, который будет участвовать в создании кадров
+        # все файлы загружаются одновременно
+        with concurrent.futures.ThreadPoolExecutor(max_workers=7) as executor:
+            futures = [executor.submit(
+                read_csv_file,
+                '{}/{}'.format(input_dir, f_name), file_date_col,
+                start_date, stop_date,
+                attributes) for (_, f_name, file_date_col, attributes, _) in input_files]
+            employment_future = executor.submit(
+                read_csv_file,
+                '{}/{}'.format(input_dir, render_settings.FILE_EMPLOYMENT_NAME), render_settings.FILE_EMPLOYMENT_COL_ENTER_DATE,
+                start_date, stop_date,
+                render_settings.FILE_EMPLOYMENT_COLS,
+                preload_early_dates=True)
+            for ((stream, _, _, _, value), future) in zip(input_files, futures):
+                timeline.add(stream, aggregate_imported_table(future.result(), value) if value else future.result())
+            employment_with_dates: ImportedTable = employment_future.result()
+            del futures
+    render_date = start_date if start_date else timeline.first_date
     if not stop_date:
-        dtf: typing.List[str] = []
-        if events_with_dates:
-            dtf.append(events_with_dates[-1].date)
-        if killmails_with_dates:
-            dtf.append(killmails_with_dates[-1].date)
-        if industry_with_dates:
-            dtf.append(industry_with_dates[-1].date)
-        if market_with_dates:
-            dtf.append(market_with_dates[-1].date)
-        if bounty_with_dates:
-            dtf.append(bounty_with_dates[-1].date)
-        if mining_with_dates:
-            dtf.append(mining_with_dates[-1].date)
-        stop_date = None
-        for dt in dtf:
-            if stop_date is None or stop_date < dt:
-                stop_date = dt
+        stop_date = timeline.last_date
     # вывод отладочной информации, если требуется
     if verbose:
         print('Loaded {} events, {} killmails, {} jobs, {} markets, {} bounty, {} mining'.format(
-            len(events_with_dates),
-            len(killmails_with_dates),
-            len(industry_with_dates),
-            len(market_with_dates),
-            len(bounty_with_dates),
-            len(mining_with_dates)
+            timeline.lengths['events'],
+            timeline.lengths['killmails'],
+            timeline.lengths['industry'],
+            timeline.lengths['market'],
+            timeline.lengths['bounty'],
+            timeline.lengths['mining']
         ))
         print('Date from {} and date to {} choosen'.format(render_date, stop_date))
+    # при рендеринге в несколько процессов каждый процесс рисует свой непрерывный отрезок дней, а дни до начала
+    # отрезка только моделирует (без рисования кадров), так что состояние сцены и нумерация кадров совпадают с
+    # рендерингом в одном процессе
+    num_of_days: int = (stop_date - render_date).days + 1
+    first_day: int = num_of_days * job // jobs
+    last_day: int = num_of_days * (job + 1) // jobs
+    if verbose and jobs > 1:
+        print('Job {} of {} renders days from {} to {}'.format(job + 1, jobs, first_day, last_day - 1))
+    if first_day >= last_day:
+        return
 
     # включение/отключение режима динамического изменения карты (масштаб, перемещение фокуса и т.п.)
     regions_activity = RenderRegionsActivity(sde_regions)
@@ -1521,11 +2620,11 @@ def render_base_image(cwd: str, input_dir: str, out_dir: str, date_from: str, da
         regions_activity.build_magnifying_regions_by_dates(
             sde_regions,
             sde_pochven, pochven_date,
-            killmails_with_dates,
-            industry_with_dates,
-            market_with_dates,
-            bounty_with_dates,
-            mining_with_dates)
+            timeline.iter_columns('killmails', 'date', 'system'),
+            timeline.iter_columns('industry', 'date', 'system'),
+            timeline.iter_columns('market', 'date', 'system'),
+            timeline.iter_columns('bounty', 'date', 'system'),
+            timeline.iter_columns('mining', 'date', 'system'))
         regions_activity.plan_rough_positioning(render_date)
         regions_activity.plan_precise_positioning(render_scale)
         # если начало работы программы задано после появления Pochven в игре, то тихо корректируем регионы без
@@ -1550,8 +2649,23 @@ def render_base_image(cwd: str, input_dir: str, out_dir: str, date_from: str, da
     maximum_isk_per_day = 0
     # сортируем список звёздных систем в порядке возрастания составляющей y, так чтобы при рисовании их на плоскости
     # верхние были над нижними
-    sorted_solar_systems: typing.List[typing.Any] = list(sde_positions.values())
-    sorted_solar_systems.sort(key=lambda ss: ss[1], reverse=False)
+    sorted_solar_systems_ids: typing.Optional[typing.List[str]] = startup_cache.get('sorted_solar_systems')
+    if sorted_solar_systems_ids is None:
+        sorted_solar_systems_ids = sorted(sde_positions.keys(), key=lambda ss_id: sde_positions[ss_id][1], reverse=False)
+        startup_cache.put('sorted_solar_systems', sorted_solar_systems_ids)
+    sorted_solar_systems: typing.List[typing.Any] = [sde_positions[ss_id] for ss_id in sorted_solar_systems_ids]
+    del sorted_solar_systems_ids
+    # маски размытых кругов маркеров событий строятся один раз и используются повторно (большая часть из них повторяется)
+    sprites: RenderLRUCache = RenderLRUCache(4096)
+    # маски надписей (события, killmails, дата) растеризуются один раз, в кадрах меняется только их цвет
+    texts: RenderLRUCache = RenderLRUCache(4096)
+    # шрифты и маски названий регионов для текущего шага масштаба карты
+    region_labels: RenderRegionLabels = RenderRegionLabels(region_font)
+    # звёздное небо рисуется один раз и используется повторно, пока видимая область карты не меняется
+    starfield: RenderStarfieldCache = RenderStarfieldCache(render_scale, sorted_solar_systems, startup_cache)
+    startup_cache.save()
+    if verbose:
+        print('Startup cache {}: {} hits, {} misses'.format(startup_cache.key, startup_cache.hits, startup_cache.misses))
 
     # выбор размер пиктограммы пилота (в коллекции находятся размеры от 32px до 22px,
     # где 34px соответствует высоте шрифта size=46)
@@ -1571,62 +2685,96 @@ def render_base_image(cwd: str, input_dir: str, out_dir: str, date_from: str, da
 
     # номер фрейма, который задаёт имя файла и последовательно используется ffmpeg-программой
     image_index: int = 0
-    while True:
-        num_new_events: int = 0
-        # получаем дату "сегодняшнего дня"
-        render_date_str: str = datetime.datetime.strftime(render_date, '%Y-%m-%d')
-        if verbose:
-            print('==', render_date_str)
-        # добавляем информацию о появлении нового региона Pochven в EVE Online
-        if sde_pochven is not None and (render_date == pochven_date):
-            regions_activity.apply_patch(sde_pochven)
+    # порядковый номер дня, начиная с render_date
+    day_index: int = 0
+
+    # контрольные точки: состояние сцены сохраняется на границах суток, с тем чтобы можно было продолжить
+    # прерванный рендеринг (входные данные выбираются по дате, поэтому курсоры в них не сохраняются)
+    checkpoints: RenderCheckpoints = RenderCheckpoints(out_dir, job, jobs)
+    # видео, передаваемое ffmpeg, пишется каждый раз заново, так что продолжить его нельзя и контрольные точки не нужны
+    checkpoint_days: int = render_settings.RENDER_CHECKPOINT_DAYS
+    if render_settings.RENDER_OUTPUT_MODE == render_settings.RenderOutputMode.FFMPEG:
+        checkpoint_days = 0
+    # нарисованные кадры кодируются и пишутся на диск (или передаются ffmpeg) в фоновых потоках
+    frames_writer: FramesWriter = create_frames_writer(out_dir, job, jobs)
+    # кадры, оставшиеся в очереди, дописываются (и ffmpeg завершается) также и при ошибке или прерывании рендеринга
+    try:
+        # контрольная точка годится для продолжения, только если не изменились входные файлы и настройки, от которых
+        # зависит состояние сцены
+        checkpoint_key = (
+            startup_cache.key,
+            get_input_files_key(
+                ['{}/{}'.format(input_dir, f_name) for (_, f_name, _, _, _) in input_files] +
+                ['{}/{}'.format(input_dir, render_settings.FILE_EMPLOYMENT_NAME)]),
+            (render_settings.RENDER_FRAME_RATE, render_settings.DURATION_DATE, render_settings.MOVEMENT_MAP_ENABLED,
+             render_settings.INPUT_AGGREGATE),
+            render_date,
+            stop_date)
+        if resume:
+            checkpoint = checkpoints.load(checkpoint_key, first_day * render_settings.DURATION_DATE, frames_writer)
+            if checkpoint is not None:
+                render_date = checkpoint['render_date']
+                day_index = checkpoint['day_index']
+                image_index = checkpoint['image_index']
+                render_fade_in = checkpoint['render_fade_in']
+                maximum_num_of_industry_jobs = checkpoint['maximum_num_of_industry_jobs']
+                maximum_isk_per_day = checkpoint['maximum_isk_per_day']
+                if checkpoint['pochven_patched'] and sde_pochven is not None:
+                    regions_activity.apply_patch(sde_pochven)
+                    del sde_pochven
+                    sde_pochven = None
+                regions_activity.using = checkpoint['regions_using']
+                rescale_tracker.curr_index = checkpoint['rescale_curr_index']
+                rescale_tracker.curr_frame = checkpoint['rescale_curr_frame']
+                rescale_tracker.render_rescale = checkpoint['render_rescale']
+                render_rescale = rescale_tracker.render_rescale
+                if verbose:
+                    print('Resumed from {} (frame {})'.format(render_date, image_index))
+        while True:
+            num_new_events: int = 0
+            # получаем дату "сегодняшнего дня"
+            render_date_str: str = datetime.datetime.strftime(render_date, '%Y-%m-%d')
             if verbose:
-                print(' pochven'' patch applied to stored regions, {} regions corrected'.format(len(sde_pochven)))
-            del sde_pochven
-            sde_pochven = None
-            # ---
-            render_fade_in.add_region(RenderFadeInRegion(10000070, color=render_settings.EVENTS_SETUP[5][0]))  # region_id=Pochven
-            render_fade_in.add_event(RenderFadeInEvent("Pochven is the region of space introduces at October 13 2020", 5))
-            num_new_events += 1
-        # добавляем события "сегодняшнего дня" в список отрисовки
-        if events_with_dates:
-            while render_date == events_with_dates[0].date:
-                e: RenderFadeInEvent = RenderFadeInEvent(
-                    events_with_dates[0].txt,
-                    events_with_dates[0].level)
+                print('==', render_date_str)
+            # добавляем информацию о появлении нового региона Pochven в EVE Online
+            if sde_pochven is not None and (render_date == pochven_date):
+                regions_activity.apply_patch(sde_pochven)
+                if verbose:
+                    print(' pochven'' patch applied to stored regions, {} regions corrected'.format(len(sde_pochven)))
+                del sde_pochven
+                sde_pochven = None
+                # ---
+                render_fade_in.add_region(RenderFadeInRegion(10000070, color=render_settings.EVENTS_SETUP[5][0]))  # region_id=Pochven
+                render_fade_in.add_event(RenderFadeInEvent("Pochven is the region of space introduces at October 13 2020", 5))
+                num_new_events += 1
+            # добавляем события "сегодняшнего дня" в список отрисовки
+            for item in timeline.get_rows('events', render_date):
+                e: RenderFadeInEvent = RenderFadeInEvent(item.txt, item.level)
                 render_fade_in.add_event(e)
                 num_new_events += 1
-                del events_with_dates[0]
-                if not events_with_dates:
-                    break
-        # добавляем киллмылы "сегодняшнего для" в список отрисовки, готовим маркеры для карты
-        if killmails_with_dates:
+            # добавляем киллмылы "сегодняшнего для" в список отрисовки, готовим маркеры для карты
             num_new_killmails: int = 0
-            while render_date == killmails_with_dates[0].date:
-                solar_system_id: int = killmails_with_dates[0].system
+            for item in timeline.get_rows('killmails', render_date):
+                solar_system_id: int = item.system
                 new_region_id = regions_activity.mark_last_time_usage(solar_system_id, render_date)
                 if new_region_id is not None:
                     render_fade_in.add_region(RenderFadeInRegion(new_region_id))
                 # ---
                 p = sde_positions.get(str(solar_system_id))
                 k: RenderFadeInKillmail = RenderFadeInKillmail(
-                    killmails_with_dates[0].victim == 1,
-                    killmails_with_dates[0].txt,
-                    killmails_with_dates[0].shiptype,
-                    killmails_with_dates[0].mass,
+                    item.victim == 1,
+                    item.txt,
+                    item.shiptype,
+                    item.mass,
                     p[0] if p is not None else None, p[2] if p is not None else None)
                 render_fade_in.add_killmail(k)
                 num_new_killmails += 1
-                del killmails_with_dates[0]
-                if not killmails_with_dates:
-                    break
             if verbose and num_new_killmails:
                 print(' {} new killmails'.format(num_new_killmails))
-        # добавляем статистику производства "сегодняшнего для" в список отрисовки, готовим маркеры для карты
-        if industry_with_dates:
+            # добавляем статистику производства "сегодняшнего для" в список отрисовки, готовим маркеры для карты
             num_new_industry_jobs: int = 0
-            while render_date == industry_with_dates[0].date:
-                solar_system_id: typing.Optional[int] = industry_with_dates[0].system
+            for item in timeline.get_rows('industry', render_date):
+                solar_system_id: typing.Optional[int] = item.system
                 p = None
                 if solar_system_id is not None:
                     new_region_id = regions_activity.mark_last_time_usage(solar_system_id, render_date)
@@ -1634,13 +2782,10 @@ def render_base_image(cwd: str, input_dir: str, out_dir: str, date_from: str, da
                         render_fade_in.add_region(RenderFadeInRegion(new_region_id))
                     p = sde_positions.get(str(solar_system_id))
                 k: RenderFadeInIndustry = RenderFadeInIndustry(
-                    industry_with_dates[0].jobs,
+                    item.jobs,
                     p[0] if p is not None else None, p[2] if p is not None else None)
                 render_fade_in.add_industry(k)
-                num_new_industry_jobs += industry_with_dates[0].jobs
-                del industry_with_dates[0]
-                if not industry_with_dates:
-                    break
+                num_new_industry_jobs += item.jobs
             if verbose and num_new_industry_jobs:
                 print(' {} new industry stat'.format(num_new_industry_jobs))
             if num_new_industry_jobs > maximum_num_of_industry_jobs:
@@ -1648,11 +2793,10 @@ def render_base_image(cwd: str, input_dir: str, out_dir: str, date_from: str, da
                 e: RenderFadeInEvent = RenderFadeInEvent('Industry achievement , {} jobs'.format(maximum_num_of_industry_jobs), 3)
                 render_fade_in.add_event(e)
                 num_new_events += 1
-        # добавляем статистику маркета "сегодняшнего для" в список отрисовки, готовим маркеры для карты
-        if market_with_dates:
+            # добавляем статистику маркета "сегодняшнего для" в список отрисовки, готовим маркеры для карты
             sum_isk_per_day: int = 0
-            while render_date == market_with_dates[0].date:
-                solar_system_id: typing.Optional[int] = market_with_dates[0].system
+            for item in timeline.get_rows('market', render_date):
+                solar_system_id: typing.Optional[int] = item.system
                 p = None
                 if solar_system_id is not None:
                     new_region_id = regions_activity.mark_last_time_usage(solar_system_id, render_date)
@@ -1660,13 +2804,10 @@ def render_base_image(cwd: str, input_dir: str, out_dir: str, date_from: str, da
                         render_fade_in.add_region(RenderFadeInRegion(new_region_id))
                     p = sde_positions.get(str(solar_system_id))
                 m: RenderFadeInMarket = RenderFadeInMarket(
-                    market_with_dates[0].isk,
+                    item.isk,
                     p[0] if p is not None else None, p[2] if p is not None else None)
                 render_fade_in.add_market(m)
-                sum_isk_per_day += int(market_with_dates[0].isk)
-                del market_with_dates[0]
-                if not market_with_dates:
-                    break
+                sum_isk_per_day += int(item.isk)
             if verbose and sum_isk_per_day:
                 print(' {} ISK in market operations'.format(sum_isk_per_day))
             if sum_isk_per_day > maximum_isk_per_day:
@@ -1674,11 +2815,10 @@ def render_base_image(cwd: str, input_dir: str, out_dir: str, date_from: str, da
                 e: RenderFadeInEvent = RenderFadeInEvent('Market achievement, {:,d} ISK'.format(maximum_isk_per_day), 4)
                 render_fade_in.add_event(e)
                 num_new_events += 1
-        # добавляем статистику крабства "сегодняшнего для" в список отрисовки, готовим маркеры для карты
-        if bounty_with_dates:
+            # добавляем статистику крабства "сегодняшнего для" в список отрисовки, готовим маркеры для карты
             sum_isk_per_day: int = 0
-            while render_date == bounty_with_dates[0].date:
-                solar_system_id: typing.Optional[int] = bounty_with_dates[0].system
+            for item in timeline.get_rows('bounty', render_date):
+                solar_system_id: typing.Optional[int] = item.system
                 p = None
                 if solar_system_id is not None:
                     new_region_id = regions_activity.mark_last_time_usage(solar_system_id, render_date)
@@ -1686,20 +2826,16 @@ def render_base_image(cwd: str, input_dir: str, out_dir: str, date_from: str, da
                         render_fade_in.add_region(RenderFadeInRegion(new_region_id))
                     p = sde_positions.get(str(solar_system_id))
                 b: RenderFadeInBounty = RenderFadeInBounty(
-                    bounty_with_dates[0].isk,
+                    item.isk,
                     p[0] if p is not None else None, p[2] if p is not None else None)
                 render_fade_in.add_bounty(b)
-                sum_isk_per_day += int(bounty_with_dates[0].isk)
-                del bounty_with_dates[0]
-                if not bounty_with_dates:
-                    break
+                sum_isk_per_day += int(item.isk)
             if verbose and sum_isk_per_day:
                 print(' {} ISK in bounty operations'.format(sum_isk_per_day))
-        # добавляем статистику майнинг "сегодняшнего для" в список отрисовки, готовим маркеры для карты
-        if mining_with_dates:
+            # добавляем статистику майнинг "сегодняшнего для" в список отрисовки, готовим маркеры для карты
             sum_quantity_per_day: int = 0
-            while render_date == mining_with_dates[0].date:
-                solar_system_id: typing.Optional[int] = mining_with_dates[0].system
+            for item in timeline.get_rows('mining', render_date):
+                solar_system_id: typing.Optional[int] = item.system
                 p = None
                 if solar_system_id is not None:
                     new_region_id = regions_activity.mark_last_time_usage(solar_system_id, render_date)
@@ -1707,71 +2843,119 @@ def render_base_image(cwd: str, input_dir: str, out_dir: str, date_from: str, da
                         render_fade_in.add_region(RenderFadeInRegion(new_region_id))
                     p = sde_positions.get(str(solar_system_id))
                 m: RenderFadeInMining = RenderFadeInMining(
-                    mining_with_dates[0].quantity,
+                    item.quantity,
                     p[0] if p is not None else None, p[2] if p is not None else None)
                 render_fade_in.add_mining(m)
-                sum_quantity_per_day += int(mining_with_dates[0].quantity)
-                del mining_with_dates[0]
-                if not mining_with_dates:
-                    break
+                sum_quantity_per_day += int(item.quantity)
             if verbose and sum_quantity_per_day:
                 print(' {} in mining operations'.format(sum_quantity_per_day))
-        # выводим отладку на экран, если включена
-        if verbose and num_new_events:
-            print(' {} new events'.format(num_new_events))
-
-        # ---
-        for frame_idx in range(render_settings.DURATION_DATE):
-            # создаём канву на которой будем рисовать
-            canvas = Image.new('RGB', (render_settings.RENDER_WIDTH, render_settings.RENDER_HEIGHT), 'black')
-            img_draw = ImageDraw.Draw(canvas, 'RGB')
-            # меняем масштаб марты и смещаем её, если включён режим динамического формирования карты
-            if render_settings.MOVEMENT_MAP_ENABLED:
-                render_rescale = rescale_tracker.next() if render_rescale else rescale_tracker.begin()
-            # наносим на изображение контуры регионов (отладочный режим, рамки регионов рисуются под картой)
-            if render_settings.MOVEMENT_MAP_ENABLED and render_settings.MOVEMENT_MAP_DEBUG:
-                regions_activity.draw_contours_of_magnifier_debug_only(img_draw, render_scale, render_date)
-                regions_activity.draw_contours_of_regions_debug_only(img_draw, render_scale, region_font)
-            # генерируем рисовалку вселенной и корпоративных событий
-            renderer: RenderUniverse = RenderUniverse(canvas, img_draw, render_scale, render_rescale, date_font, events_font, events_font, region_font)
-            # рисуем названия регионов на карте
-            renderer.draw_regions(regions_activity.regions, render_fade_in.regions)
-            # генерируем базовый фон с нанесёнными на него звёздами Вселенной EVE
-            for p in sorted_solar_systems:
-                renderer.draw_solar_system(p[0], p[2], p[3])
-            # наносим на изображение список пилотов (д.б. выполнено до вывода событий, для расчёта границ вывода)
-            renderer.draw_pilots(pilots, render_date, frame_idx / render_settings.DURATION_DATE)
-            # наносим дату на изображение
-            renderer.draw_date_caption(render_date_str)
-            # наносим на изображение надписи и тушим на их на шаг прозрачности
-            renderer.draw_events_list(render_fade_in.events)
-            renderer.draw_killmails_list(render_fade_in.killmails_in_list)
-            # наносим на изображение места гибели кораблей
-            renderer.draw_killmails_map(render_fade_in.killmails_on_map)
-            # наносим на изображение майнинг в регионах
-            renderer.draw_mining_map(render_fade_in.mining)
-            # наносим на изображение производственные фабрики
-            renderer.draw_industry_map(render_fade_in.industry)
-            # наносим на изображение рыночные сделки
-            renderer.draw_market_map(render_fade_in.market)
-            # наносим на изображение крабство в регионах
-            renderer.draw_bounty_map(render_fade_in.bounty)
-            # событиям, находящимся в репозитории "затухания" повышается прозрачность
-            render_fade_in.pass_frame()
-
-            # canvas.save('{}/{}_{:0>3}.png'.format(out_dir, render_date_str, frame_idx))
-            canvas.save('{}/{:0>5}.png'.format(out_dir, image_index))
-            image_index += 1
-            # DEBUG: canvas.show()
-            # DEBUG: return
-
-        del img_draw
-        del canvas
-        # ---
-        if render_date == stop_date:
-            break
-        regions_activity.pass_to_date(render_date)
-        render_date += datetime.timedelta(days=1)
+            # выводим отладку на экран, если включена
+            if verbose and num_new_events:
+                print(' {} new events'.format(num_new_events))
 
+            # ---
+            for frame_idx in range(render_settings.DURATION_DATE):
+                # меняем масштаб марты и смещаем её, если включён режим динамического формирования карты
+                if render_settings.MOVEMENT_MAP_ENABLED:
+                    render_rescale = rescale_tracker.next() if render_rescale else rescale_tracker.begin()
+                # кадры, которые рисует другой процесс, пропускаем (но состояние сцены меняется так же, как при рисовании)
+                if day_index < first_day:
+                    render_fade_in.pass_frame()
+                    image_index += 1
+                    continue
+                # базовый фон с нанесёнными на него звёздами Вселенной EVE (фон перерисовывается только тогда, когда
+                # меняется видимая область карты)
+                starfield_img: Image = starfield.get(render_rescale)
+                # создаём канву на которой будем рисовать, копируя в неё звёздное небо (в отладочном режиме контуры
+                # регионов рисуются под звёздами, поэтому канва чёрная, а звёзды накладываются после надписей)
+                debug_contours: bool = render_settings.MOVEMENT_MAP_ENABLED and render_settings.MOVEMENT_MAP_DEBUG
+                if debug_contours:
+                    canvas = Image.new('RGB', (render_settings.RENDER_WIDTH, render_settings.RENDER_HEIGHT), 'black')
+                else:
+                    canvas = starfield_img.copy()
+                img_draw = ImageDraw.Draw(canvas, 'RGB')
+                # наносим на изображение контуры регионов (отладочный режим, рамки регионов рисуются под картой)
+                if debug_contours:
+                    regions_activity.draw_contours_of_magnifier_debug_only(img_draw, render_scale, render_date)
+                    regions_activity.draw_contours_of_regions_debug_only(img_draw, render_scale, region_font)
+                # генерируем рисовалку вселенной и корпоративных событий
+                renderer: RenderUniverse = RenderUniverse(canvas, img_draw, render_scale, render_rescale, date_font, events_font, events_font, region_labels, sprites, texts)
+                # рисуем названия регионов на карте (звёзды оказываются поверх названий)
+                renderer.draw_regions(regions_activity.regions, render_fade_in.get_regions(), None if debug_contours else starfield_img)
+                if debug_contours:
+                    renderer.draw_starfield(starfield_img)
+                # наносим на изображение список пилотов (д.б. выполнено до вывода событий, для расчёта границ вывода)
+                renderer.draw_pilots(pilots, render_date, frame_idx / render_settings.DURATION_DATE)
+                # наносим дату на изображение
+                renderer.draw_date_caption(render_date_str)
+                # наносим на изображение надписи и тушим на их на шаг прозрачности
+                renderer.draw_events_list(render_fade_in.get_events())
+                renderer.draw_killmails_list(render_fade_in.killmails, render_fade_in.frame)
+                # наносим на изображение места гибели кораблей
+                renderer.draw_killmails_map(render_fade_in.killmails, render_fade_in.frame)
+                # наносим на изображение майнинг в регионах
+                renderer.draw_mining_map(render_fade_in.mining, render_fade_in.frame)
+                # наносим на изображение производственные фабрики
+                renderer.draw_industry_map(render_fade_in.industry, render_fade_in.frame)
+                # наносим на изображение рыночные сделки
+                renderer.draw_market_map(render_fade_in.market, render_fade_in.frame)
+                # наносим на изображение крабство в регионах
+                renderer.draw_bounty_map(render_fade_in.bounty, render_fade_in.frame)
+                # накладываем на изображение все маркеры событий на карте разом
+                renderer.draw_markers()
+                # событиям, находящимся в репозитории "затухания" повышается прозрачность
+                render_fade_in.pass_frame()
+
+                # canvas.save('{}/{}_{:0>3}.png'.format(out_dir, render_date_str, frame_idx))
+                frames_writer.write(image_index, canvas)
+                image_index += 1
+                # DEBUG: canvas.show()
+                # DEBUG: return
+
+            if day_index >= first_day:
+                del img_draw
+                del canvas
+            # ---
+            if render_date == stop_date or (day_index + 1) >= last_day:
+                break
+            day_index += 1
+            regions_activity.pass_to_date(render_date)
+            render_date += datetime.timedelta(days=1)
+            # сохраняем состояние сцены на начало очередных суток
+            if checkpoint_days and (day_index % checkpoint_days) == 0:
+                # кадры, стоящие в очереди, дописываются на диск, чтобы контрольная точка ссылалась на записанные кадры
+                frames_writer.flush()
+                checkpoints.save(checkpoint_key, image_index, {
+                    'frames': frames_writer.get_frames(first_day * render_settings.DURATION_DATE, image_index),
+                    'render_date': render_date,
+                    'day_index': day_index,
+                    'image_index': image_index,
+                    'render_fade_in': render_fade_in,
+                    'maximum_num_of_industry_jobs': maximum_num_of_industry_jobs,
+                    'maximum_isk_per_day': maximum_isk_per_day,
+                    'pochven_patched': sde_pochven is None,
+                    'regions_using': regions_activity.using,
+                    'rescale_curr_index': rescale_tracker.curr_index,
+                    'rescale_curr_frame': rescale_tracker.curr_frame,
+                    'render_rescale': render_rescale,
+                })
+    finally:
+        frames_writer.close()
+    if verbose:
+        print('Frames written {}, max queue depth {}, drawing stalled {:.1f} sec, encoding took {:.1f} sec'.format(
+            frames_writer.frames, frames_writer.max_queue_depth, frames_writer.stall_seconds, frames_writer.encode_seconds))
+        print('Frames unchanged {}, duplicated {}'.format(frames_writer.unchanged, frames_writer.duplicates))
+        print('Starfield redrawn {} times, reused {} times'.format(starfield.misses, starfield.hits))
+        print('Sprites cache: {} hits, {} misses, {} evictions'.format(sprites.hits, sprites.misses, sprites.evictions))
+        print('Texts cache: {} hits, {} misses, {} evictions'.format(texts.hits, texts.misses, texts.evictions))
+        print('Pilots roster redrawn {} times, reused {} times'.format(pilots.misses, pilots.hits))
+        print('Region labels: {} hits, {} misses, {} evictions'.format(region_labels.hits, region_labels.misses, region_labels.evictions))
+
+    del frames_writer
+    del starfield
+    del startup_cache
+    del sprites
+    del texts
+    del region_labels
     del sde_positions
     del sde_names
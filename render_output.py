@@ -0,0 +1,464 @@
+﻿import typing
+import abc
+import os
+import time
+import queue
+import threading
+import subprocess
+import struct
+import zlib
+import mmap
+import hashlib
+import numpy as np
+from PIL import Image
+
+import render_settings
+
+
+class FramesWriter(abc.ABC):
+    def __init__(self, threads: int, queue_size: int):
+        # нарисованные кадры передаются через ограниченную очередь потокам, которые их кодируют и пишут, пока основной
+        # поток рисует следующие кадры; в памяти одновременно находится не больше queue_size нарисованных кадров
+        self.__queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.__error: typing.Optional[BaseException] = None
+        self.__lock: threading.Lock = threading.Lock()
+        self.__threads: typing.List[threading.Thread] = [
+            threading.Thread(target=self.__encode, name='frames-writer-{}'.format(i), daemon=True) for i in range(threads)]
+        for t in self.__threads:
+            t.start()
+        # статистика работы конвейера
+        self.frames: int = 0
+        self.max_queue_depth: int = 0
+        self.stall_seconds: float = 0.0  # сколько ждал рисующий поток, пока в очереди освободится место
+        self.encode_seconds: float = 0.0  # суммарное время кодирования и записи кадров во всех потоках
+        self.unchanged: int = 0  # кадры, которые уже были записаны таким же предыдущим рендерингом
+        self.duplicates: int = 0  # кадры, совпавшие с ранее записанными кадрами (записаны ссылками на них)
+
+    def get_frames(self, first_image_index: int, last_image_index: int) -> typing.Optional[typing.Dict[int, typing.Any]]:
+        # сведения о записанных кадрах, по которым можно проверить, что на диске лежат именно эти кадры; по умолчанию
+        # ранее записанные кадры недоступны (продолжить прерванный рендеринг нельзя)
+        return None
+
+    def has_frames(self, first_image_index: int, last_image_index: int, frames: typing.Optional[typing.Dict[int, typing.Any]]) -> bool:
+        # кадры, записанные рендерингом (сведения о них сохранены в frames), всё ещё лежат на диске и не перезаписаны
+        current: typing.Optional[typing.Dict[int, typing.Any]] = self.get_frames(first_image_index, last_image_index)
+        return current is not None and current == frames
+
+    @abc.abstractmethod
+    def write_frame(self, image_index: int, img: Image):
+        pass
+
+    def finish(self):
+        pass
+
+    def __encode(self):
+        while True:
+            item = self.__queue.get()
+            if item is None:
+                break
+            image_index, img = item
+            started: float = time.monotonic()
+            try:
+                self.write_frame(image_index, img)
+            except BaseException as e:
+                # сообщается первая ошибка (последующие кадры, как правило, падают по той же причине)
+                if self.__error is None:
+                    self.__error = e
+            finally:
+                self.__queue.task_done()
+            with self.__lock:
+                self.encode_seconds += time.monotonic() - started
+
+    def __check(self):
+        if self.__error is not None:
+            raise self.__error
+
+    def write(self, image_index: int, img: Image):
+        self.__check()
+        started: float = time.monotonic()
+        self.__queue.put((image_index, img))
+        self.stall_seconds += time.monotonic() - started
+        self.frames += 1
+        self.max_queue_depth = max(self.max_queue_depth, self.__queue.qsize())
+
+    def flush(self):
+        # ожидание, пока все переданные кадры не будут записаны
+        self.__queue.join()
+        self.__check()
+
+    def close(self):
+        for _ in self.__threads:
+            self.__queue.put(None)
+        for t in self.__threads:
+            t.join()
+        self.finish()
+        self.__check()
+
+
+def get_frame_digest(img: Image) -> bytes:
+    # хеш содержимого кадра (хеширование больших буферов отпускает GIL, поэтому выполняется в потоках записи)
+    digest = hashlib.blake2b('{}x{}'.format(img.width, img.height).encode(), digest_size=16)
+    digest.update(img.tobytes())
+    return digest.digest()
+
+
+class PngFramesWriter(FramesWriter):
+    def __init__(self, out_dir: str, threads: int, queue_size: int, manifest_name: typing.Optional[str] = None):
+        # кадры пишутся в каталог последовательностью png файлов (сжатие png отпускает GIL, поэтому потоков несколько)
+        self.out_dir: str = out_dir
+        # если задан манифест, то для каждого записанного кадра в нём сохраняются хеш содержимого и inode/размер/время
+        # модификации файла: совпадающий кадр не перезаписывается, а повторяющийся кадр записывается жёсткой ссылкой
+        self.__lock: threading.Lock = threading.Lock()
+        self.__manifest = None
+        self.__frames: typing.Dict[str, typing.Tuple[bytes, typing.Tuple[int, int, int]]] = {}  # name: (digest, stat)
+        self.__digests: typing.Dict[bytes, str] = {}  # digest: name
+        if manifest_name is not None:
+            self.__open_manifest(manifest_name)
+        super().__init__(threads, queue_size)
+
+    def __get_stat(self, name: str) -> typing.Optional[typing.Tuple[int, int, int]]:
+        try:
+            st = os.stat('{}/{}'.format(self.out_dir, name))
+        except OSError:
+            return None
+        return st.st_ino, st.st_size, st.st_mtime_ns
+
+    def __open_manifest(self, manifest_name: str):
+        # читаются манифесты всех процессов (каталог мог быть заполнен рендерингом с другим --jobs), запись манифеста
+        # считается действительной, пока файл кадра не изменился, поэтому порядок чтения манифестов не важен
+        for f_name in sorted(os.listdir(self.out_dir)):
+            if not f_name.startswith('.frames_') or not f_name.endswith('.manifest'):
+                continue
+            with open('{}/{}'.format(self.out_dir, f_name), 'rt', encoding='utf8') as f:
+                for line in f:
+                    item: typing.List[str] = line.split()
+                    if len(item) != 5:  # недописанная строка
+                        continue
+                    stat: typing.Tuple[int, int, int] = (int(item[2]), int(item[3]), int(item[4]))
+                    if self.__get_stat(item[0]) == stat:
+                        self.__frames[item[0]] = (bytes.fromhex(item[1]), stat)
+                        self.__digests[bytes.fromhex(item[1])] = item[0]
+        # свой манифест переписывается только действительными записями и дальше дописывается по мере записи кадров
+        f_name: str = '{}/{}'.format(self.out_dir, manifest_name)
+        with open('{}.tmp'.format(f_name), 'wt', encoding='utf8') as f:
+            for (name, (digest, stat)) in sorted(self.__frames.items()):
+                f.write(self.__get_manifest_line(name, digest, stat))
+        os.replace('{}.tmp'.format(f_name), f_name)
+        self.__manifest = open(f_name, 'at', encoding='utf8')
+
+    @staticmethod
+    def __get_manifest_line(name: str, digest: bytes, stat: typing.Tuple[int, int, int]) -> str:
+        return '{} {} {} {} {}\n'.format(name, digest.hex(), *stat)
+
+    @staticmethod
+    def get_frame_name(image_index: int) -> str:
+        return '{:0>5}.png'.format(image_index)
+
+    def get_frames(self, first_image_index: int, last_image_index: int) -> typing.Optional[typing.Dict[int, typing.Any]]:
+        # файл кадра опознаётся по inode/размеру/времени модификации, а при ведении манифеста ещё и по хешу
+        # содержимого (кадр должен быть записан в манифест и с тех пор не изменён)
+        frames: typing.Dict[int, typing.Any] = {}
+        for i in range(first_image_index, last_image_index):
+            name: str = self.get_frame_name(i)
+            stat: typing.Optional[typing.Tuple[int, int, int]] = self.__get_stat(name)
+            if stat is None:
+                return None
+            if self.__manifest is None:
+                frames[i] = stat
+                continue
+            with self.__lock:
+                known = self.__frames.get(name)
+            if known is None or known[1] != stat:
+                return None
+            frames[i] = known
+        return frames
+
+    def write_frame(self, image_index: int, img: Image):
+        # кадр пишется под временным именем и переименовывается, так что на диске не бывает недописанных кадров
+        name: str = self.get_frame_name(image_index)
+        f_name: str = '{}/{}'.format(self.out_dir, name)
+        # временный файл, оставшийся от прерванного рендеринга, может быть жёсткой ссылкой на другой кадр, поэтому
+        # он удаляется, а не перезаписывается (запись через ссылку испортила бы тот кадр)
+        if os.path.lexists('{}.tmp'.format(f_name)):
+            os.remove('{}.tmp'.format(f_name))
+        if self.__manifest is None:
+            img.save('{}.tmp'.format(f_name), format='PNG')
+            os.replace('{}.tmp'.format(f_name), f_name)
+            return
+        digest: bytes = get_frame_digest(img)
+        with self.__lock:
+            known = self.__frames.get(name)
+            source: typing.Optional[str] = self.__digests.get(digest)
+            if source is not None and self.__frames[source][0] != digest:
+                source = None  # файл-источник уже перезаписан другим кадром
+            source_stat = self.__frames[source][1] if source is not None else None
+        # такой же кадр уже лежит на диске (записан предыдущим рендерингом)
+        if known is not None and known[0] == digest and self.__get_stat(name) == known[1]:
+            with self.__lock:
+                self.unchanged += 1
+            return
+        # такой же кадр уже записан под другим номером: вместо кодирования png создаётся жёсткая ссылка на него (после
+        # создания ссылки проверяется, что файл-источник не успел перезаписать другой поток)
+        linked: bool = False
+        if source is not None:
+            try:
+                os.link('{}/{}'.format(self.out_dir, source), '{}.tmp'.format(f_name))
+            except OSError:
+                pass
+            else:
+                linked = self.__get_stat('{}.tmp'.format(name)) == source_stat
+                if not linked:
+                    # ссылка указывает на уже перезаписанный файл: она удаляется, и кадр пишется в новый файл
+                    os.remove('{}.tmp'.format(f_name))
+        if not linked:
+            img.save('{}.tmp'.format(f_name), format='PNG')
+        os.replace('{}.tmp'.format(f_name), f_name)
+        stat: typing.Tuple[int, int, int] = self.__get_stat(name)
+        with self.__lock:
+            self.__frames[name] = (digest, stat)
+            if not linked:
+                self.__digests[digest] = name
+            else:
+                self.duplicates += 1
+            self.__manifest.write(self.__get_manifest_line(name, digest, stat))
+            self.__manifest.flush()
+
+    def finish(self):
+        if self.__manifest is not None:
+            self.__manifest.close()
+
+
+class FfmpegFramesWriter(FramesWriter):
+    def __init__(self, f_name: str, width: int, height: int, queue_size: int):
+        # кадры передаются запущенному ffmpeg в виде "сырых" RGB данных через stdin (порядок кадров важен, поэтому
+        # поток записи один, а кодирование видео выполняется процессом ffmpeg)
+        self.f_name: str = f_name
+        self.__ffmpeg: subprocess.Popen = subprocess.Popen(
+            [render_settings.RENDER_FFMPEG_BINARY, '-y', '-loglevel', 'error',
+             '-f', 'rawvideo', '-pix_fmt', 'rgb24',
+             '-s', '{}x{}'.format(width, height),
+             '-r', str(render_settings.RENDER_FRAME_RATE),
+             '-i', '-'] + render_settings.RENDER_FFMPEG_OUTPUT_ARGS + [f_name],
+            stdin=subprocess.PIPE)
+        super().__init__(1, queue_size)
+
+    def write_frame(self, image_index: int, img: Image):
+        try:
+            self.__ffmpeg.stdin.write(img.tobytes())
+        except BrokenPipeError:
+            # ffmpeg завершился раньше времени (ошибка кодирования, нет места на диске и т.п.)
+            raise Exception('ffmpeg exited with code {} while writing {}'.format(self.__ffmpeg.wait(), self.f_name))
+
+    def finish(self):
+        try:
+            self.__ffmpeg.stdin.close()
+        except BrokenPipeError:
+            pass
+        if self.__ffmpeg.wait() != 0:
+            raise Exception('ffmpeg failed with exit code {} while writing {}'.format(self.__ffmpeg.returncode, self.f_name))
+
+
+class FramesContainer:
+    # формат контейнера кадров: заголовок, за которым друг за другом следуют кадры ("сырые" RGB данные, или сжатые
+    # zlib-ом), а рядом лежит файл индекса с записями (номер кадра, смещение, длина), который дописывается только
+    # после того, как кадр полностью записан; при повторной записи кадра действует последняя запись индекса;
+    # одинаковые кадры хранятся один раз, а записи индекса ссылаются на одни и те же данные
+    MAGIC: bytes = b'QSFC'
+    VERSION: int = 2
+    HEADER: struct.Struct = struct.Struct('<4sIIII')  # magic, version, width, height, compression
+    INDEX: struct.Struct = struct.Struct('<IQQ16s')  # image_index, offset, length, digest
+    NO_DIGEST: bytes = bytes(16)
+
+    @staticmethod
+    def get_index_name(f_name: str) -> str:
+        return '{}.idx'.format(f_name)
+
+    @staticmethod
+    def read_index(f_name: str) -> typing.Dict[int, typing.Tuple[int, int, bytes]]:
+        index: typing.Dict[int, typing.Tuple[int, int, bytes]] = {}
+        if not os.path.isfile(f_name) or not os.path.isfile(FramesContainer.get_index_name(f_name)):
+            return index
+        size: int = os.path.getsize(f_name)
+        with open(FramesContainer.get_index_name(f_name), 'rb') as f:
+            data: bytes = f.read()
+        # недописанная последняя запись (и кадры, не поместившиеся в файл данных) игнорируются
+        for (image_index, offset, length, digest) in FramesContainer.INDEX.iter_unpack(data[:len(data) - len(data) % FramesContainer.INDEX.size]):
+            if offset + length <= size:
+                index[image_index] = (offset, length, digest)
+        return index
+
+
+class ContainerFramesWriter(FramesWriter):
+    def __init__(self, f_name: str, compression: int, queue_size: int, dedup: bool = False):
+        # все кадры дописываются в один файл (порядок записи важен, поэтому поток записи один)
+        self.f_name: str = f_name
+        self.compression: int = compression
+        # если включено исключение повторов, то кадр, совпадающий с уже записанным (в т.ч. предыдущим рендерингом),
+        # в файл данных не пишется, в индекс добавляется ссылка на имеющиеся данные
+        self.dedup: bool = dedup
+        self.__frames: typing.Dict[int, bytes] = {}  # image_index: digest
+        self.__digests: typing.Dict[bytes, typing.Tuple[int, int]] = {}  # digest: (offset, length)
+        self.__recover()
+        if dedup:
+            for (image_index, (offset, length, digest)) in FramesContainer.read_index(f_name).items():
+                if digest != FramesContainer.NO_DIGEST:
+                    self.__frames[image_index] = digest
+                    self.__digests[digest] = (offset, length)
+        self.__data = open(f_name, 'ab')
+        if self.__data.tell() == 0:
+            self.__data.write(FramesContainer.HEADER.pack(
+                FramesContainer.MAGIC, FramesContainer.VERSION,
+                render_settings.RENDER_WIDTH, render_settings.RENDER_HEIGHT, compression))
+            self.__data.flush()
+        self.__index = open(FramesContainer.get_index_name(f_name), 'ab')
+        super().__init__(1, queue_size)
+
+    def __recover(self):
+        # прерванная запись может оставить в конце индекса недописанную запись, а в конце файла данных - кадр, на
+        # который индекс не ссылается; перед дозаписью они отбрасываются, иначе следующие записи индекса читались бы
+        # со сдвигом, а в файле данных навсегда остались бы лишние байты
+        index_name: str = FramesContainer.get_index_name(self.f_name)
+        size: int = os.path.getsize(self.f_name) if os.path.isfile(self.f_name) else 0
+        data: bytes = b''
+        if os.path.isfile(index_name):
+            with open(index_name, 'rb') as f:
+                data = f.read()
+        records: bytes = data[:len(data) - len(data) % FramesContainer.INDEX.size]
+        end: int = 0
+        if size < FramesContainer.HEADER.size:
+            # не дописан даже заголовок: контейнер пишется заново
+            records = b''
+        else:
+            # чужой или несовместимый файл не трогаем
+            with open(self.f_name, 'rb') as f:
+                magic, version, width, height, compression = FramesContainer.HEADER.unpack(f.read(FramesContainer.HEADER.size))
+            if magic != FramesContainer.MAGIC or version != FramesContainer.VERSION or \
+                    (width, height, compression) != (render_settings.RENDER_WIDTH, render_settings.RENDER_HEIGHT, self.compression):
+                raise Exception('Frames container {} has incompatible format'.format(self.f_name))
+            # записи индекса, ссылающиеся за пределы файла данных, также отбрасываются (дописанные кадры сделали бы
+            # их снова действительными)
+            end = FramesContainer.HEADER.size
+            valid: typing.List[bytes] = []
+            for (image_index, offset, length, digest) in FramesContainer.INDEX.iter_unpack(records):
+                if offset + length <= size:
+                    valid.append(FramesContainer.INDEX.pack(image_index, offset, length, digest))
+                    end = max(end, offset + length)
+            records = b''.join(valid)
+        if records != data:
+            with open(index_name, 'wb') as f:
+                f.write(records)
+        if size > end:
+            os.truncate(self.f_name, end)
+
+    def get_frames(self, first_image_index: int, last_image_index: int) -> typing.Optional[typing.Dict[int, typing.Any]]:
+        # кадр опознаётся по действующей записи индекса (смещение и длина данных, хеш)
+        index: typing.Dict[int, typing.Tuple[int, int, bytes]] = FramesContainer.read_index(self.f_name)
+        if not all(i in index for i in range(first_image_index, last_image_index)):
+            return None
+        return {i: index[i] for i in range(first_image_index, last_image_index)}
+
+    def write_frame(self, image_index: int, img: Image):
+        digest: bytes = get_frame_digest(img) if self.dedup else FramesContainer.NO_DIGEST
+        if self.dedup and self.__frames.get(image_index) == digest:
+            self.unchanged += 1
+            return
+        if self.dedup and digest in self.__digests:
+            offset, length = self.__digests[digest]
+            self.duplicates += 1
+        else:
+            data: bytes = img.tobytes()
+            if self.compression:
+                data = zlib.compress(data, self.compression)
+            self.__data.seek(0, os.SEEK_END)
+            offset, length = self.__data.tell(), len(data)
+            self.__data.write(data)
+            self.__data.flush()
+            if self.dedup:
+                self.__digests[digest] = (offset, length)
+        self.__index.write(FramesContainer.INDEX.pack(image_index, offset, length, digest))
+        self.__index.flush()
+        if self.dedup:
+            self.__frames[image_index] = digest
+
+    def finish(self):
+        self.__data.close()
+        self.__index.close()
+
+
+class ContainerFramesReader:
+    def __init__(self, f_names: typing.List[str]):
+        # контейнеры (при --jobs их несколько) отображаются в память, так что "сырые" кадры читаются без копирования
+        self.width: int = 0
+        self.height: int = 0
+        self.__files: typing.List[typing.Any] = []
+        self.__maps: typing.List[mmap.mmap] = []
+        self.__compression: typing.List[int] = []
+        self.__frames: typing.Dict[int, typing.Tuple[int, int, int]] = {}  # image_index: (container, offset, length)
+        for f_name in f_names:
+            f = open(f_name, 'rb')
+            magic, version, width, height, compression = FramesContainer.HEADER.unpack(f.read(FramesContainer.HEADER.size))
+            if magic != FramesContainer.MAGIC or version != FramesContainer.VERSION:
+                raise Exception('{} is not a frames container'.format(f_name))
+            if self.__maps and (width, height) != (self.width, self.height):
+                raise Exception('Frames container {} has different frame size'.format(f_name))
+            self.width, self.height = width, height
+            self.__files.append(f)
+            self.__maps.append(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+            self.__compression.append(compression)
+            for (image_index, (offset, length, _)) in FramesContainer.read_index(f_name).items():
+                self.__frames[image_index] = (len(self.__maps) - 1, offset, length)
+
+    def __len__(self) -> int:
+        return len(self.__frames)
+
+    @property
+    def indexes(self) -> typing.List[int]:
+        return sorted(self.__frames.keys())
+
+    def get_frame(self, image_index: int) -> np.ndarray:
+        container, offset, length = self.__frames[image_index]
+        if self.__compression[container]:
+            data = zlib.decompress(self.__maps[container][offset:offset + length])
+            return np.frombuffer(data, dtype=np.uint8).reshape((self.height, self.width, 3))
+        return np.frombuffer(self.__maps[container], dtype=np.uint8, count=length, offset=offset).reshape((self.height, self.width, 3))
+
+    def get_image(self, image_index: int) -> Image:
+        return Image.fromarray(self.get_frame(image_index), 'RGB')
+
+    def close(self):
+        for m in self.__maps:
+            m.close()
+        for f in self.__files:
+            f.close()
+        self.__maps, self.__files = [], []
+
+
+def create_frames_writer(out_dir: str, job: int, jobs: int) -> FramesWriter:
+    if render_settings.RENDER_OUTPUT_MODE == render_settings.RenderOutputMode.PNG:
+        # при рендеринге в несколько процессов каждый процесс ведёт свой манифест кадров (читаются они вместе)
+        return PngFramesWriter(
+            out_dir,
+            render_settings.RENDER_OUTPUT_THREADS,
+            render_settings.RENDER_OUTPUT_QUEUE_SIZE,
+            '.frames_{}_{}.manifest'.format(job, jobs) if render_settings.RENDER_OUTPUT_DEDUP else None)
+    elif render_settings.RENDER_OUTPUT_MODE == render_settings.RenderOutputMode.FFMPEG:
+        # видео пишется одним процессом целиком (ffmpeg перезаписывает файл, поэтому --jobs и --resume недоступны)
+        if jobs > 1:
+            raise Exception("FFMPEG output mode doesn't support rendering in several processes")
+        return FfmpegFramesWriter(
+            '{}/{}'.format(out_dir, render_settings.RENDER_FFMPEG_FILE_NAME),
+            render_settings.RENDER_WIDTH,
+            render_settings.RENDER_HEIGHT,
+            render_settings.RENDER_OUTPUT_QUEUE_SIZE)
+    elif render_settings.RENDER_OUTPUT_MODE == render_settings.RenderOutputMode.CONTAINER:
+        # при рендеринге в несколько процессов каждый процесс пишет свой контейнер (читаются они вместе)
+        f_name: str = render_settings.RENDER_CONTAINER_FILE_NAME
+        if jobs > 1:
+            f_name = '{0}.{2:0>2}{1}'.format(*os.path.splitext(f_name), job)
+        return ContainerFramesWriter(
+            '{}/{}'.format(out_dir, f_name),
+            render_settings.RENDER_CONTAINER_COMPRESSION,
+            render_settings.RENDER_OUTPUT_QUEUE_SIZE,
+            render_settings.RENDER_OUTPUT_DEDUP)
+    else:
+        raise Exception("Unsupported output mode")
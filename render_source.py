@@ -0,0 +1,131 @@
+﻿import typing
+import os
+import re
+import csv
+import json
+import mmap
+import hashlib
+import datetime
+
+import render_settings
+from render import seek_csv_date
+
+
+class DbSource:
+    def __init__(self, connection: typing.Any, paramstyle: str, queries: typing.Dict[str, str], out_dir: str):
+        # источник данных - любое DB-API соединение (paramstyle - атрибут модуля драйвера, например sqlite3.paramstyle),
+        # запросы - {имя файла выгрузки: текст запроса}; если в запросе есть параметр :since, то выгрузка обновляется
+        # инкрементально: запрашиваются только строки, начиная с последней загруженной даты (отметка уровня хранится
+        # в .db_source.json в каталоге с выгрузками), иначе выгрузка каждый раз перезаписывается целиком
+        self.connection: typing.Any = connection
+        self.paramstyle: str = paramstyle
+        self.queries: typing.Dict[str, str] = queries
+        self.out_dir: str = out_dir
+        self.state_name: str = '{}/.db_source.json'.format(out_dir)
+        self.state: typing.Dict[str, typing.Dict[str, str]] = {}
+        if os.path.isfile(self.state_name):
+            with open(self.state_name, 'rt', encoding='utf8') as f:
+                self.state = json.load(f)
+
+    def save_state(self):
+        with open('{}.tmp'.format(self.state_name), 'wt', encoding='utf8') as f:
+            json.dump(self.state, f, indent=1)
+        os.replace('{}.tmp'.format(self.state_name), self.state_name)
+
+    @staticmethod
+    def read_queries(f_name: str) -> typing.Dict[str, str]:
+        # файл в формате queries.sql: перед каждым запросом комментарий с именем файла выгрузки, запрос
+        # заканчивается символом ';' (следующие за ним комментарии с примерами выгрузки пропускаются)
+        queries: typing.Dict[str, str] = {}
+        name: typing.Optional[str] = None
+        lines: typing.List[str] = []
+        with open(f_name, 'rt', encoding='utf8') as f:
+            for line in f:
+                header = re.match(r'^--\s*(\S+\.txt)\s*$', line)
+                if header:
+                    name, lines = header.group(1), []
+                elif name is not None:
+                    lines.append(line)
+                    if line.rstrip().endswith(';'):
+                        queries[name] = ''.join(lines).rstrip().rstrip(';')
+                        name = None
+        return queries
+
+    def get_statement(self, query: str, since: str) -> typing.Tuple[str, typing.Any]:
+        # параметр :since подставляется в запрос в формате, который понимает драйвер БД
+        num: int = len(re.findall(r':since\b', query))
+        if self.paramstyle == 'qmark':
+            return re.sub(r':since\b', '?', query), (since,) * num
+        elif self.paramstyle == 'numeric':
+            return re.sub(r':since\b', ':1', query), (since,)
+        elif self.paramstyle == 'named':
+            return query, {'since': since}
+        elif self.paramstyle == 'format':
+            return re.sub(r':since\b', '%s', query.replace('%', '%%')), (since,) * num
+        elif self.paramstyle == 'pyformat':
+            return re.sub(r':since\b', '%(since)s', query.replace('%', '%%')), {'since': since}
+        raise Exception('Unsupported DB-API paramstyle {}'.format(self.paramstyle))
+
+    def fetch(self, query: str, since: str) -> typing.Iterator[typing.Sequence[typing.Any]]:
+        # строки читаются порциями по INPUT_DB_FETCH_SIZE, так что в памяти не находится вся выборка
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute(*self.get_statement(query, since))
+            while True:
+                rows = cursor.fetchmany(render_settings.INPUT_DB_FETCH_SIZE)
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            cursor.close()
+
+    @staticmethod
+    def get_value(val: typing.Any) -> str:
+        if val is None:
+            return ''
+        elif isinstance(val, (datetime.datetime, datetime.date)):
+            return val.strftime('%Y-%m-%d')
+        return str(val)
+
+    def export(self, f_name: str, full: bool = False) -> int:
+        # обновление выгрузки f_name (даты в первой колонке, строки упорядочены по датам): строки последних
+        # INPUT_DB_OVERLAP_DAYS дней до последней загруженной даты отрезаются (эти дни могли быть выгружены не
+        # полностью, а в БД могли позже появиться строки с этими датами) и дописываются заново вместе с более новыми
+        # строками; строки, появившиеся в БД с более ранними датами, попадают в выгрузку только при full=True;
+        # возвращается кол-во полученных строк
+        query: str = self.queries[f_name]
+        path: str = '{}/{}'.format(self.out_dir, f_name)
+        digest: str = hashlib.sha1(query.encode('utf8')).hexdigest()
+        incremental: bool = re.search(r':since\b', query) is not None
+        state: typing.Optional[typing.Dict[str, str]] = self.state.get(f_name)
+        since: str = '0001-01-01'
+        offset: int = 0
+        if incremental and not full and state is not None and state['query'] == digest and os.path.isfile(path):
+            since = (datetime.datetime.strptime(state['since'][:10], '%Y-%m-%d') -
+                     datetime.timedelta(days=render_settings.INPUT_DB_OVERLAP_DAYS)).strftime('%Y-%m-%d')
+            with open(path, 'rb') as f:
+                if os.path.getsize(path):
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                        offset = seek_csv_date(data, since.encode())
+            with open(path, 'r+b') as f:
+                f.truncate(offset)
+        elif f_name in self.state:
+            # выгрузка перезаписывается целиком: если она будет прервана, то следующая тоже должна быть полной
+            del self.state[f_name]
+            self.save_state()
+        num: int = 0
+        last_date: typing.Optional[str] = None
+        with open(path, 'at' if offset else 'wt', encoding='utf8', newline='') as f:
+            writer = csv.writer(f, delimiter='\t', lineterminator='\n')
+            for row in self.fetch(query, since):
+                values: typing.List[str] = [self.get_value(val) for val in row]
+                if incremental and last_date is not None and values[0] < last_date:
+                    raise Exception('Query for {} is not ordered by date ({} after {})'.format(f_name, values[0], last_date))
+                last_date = values[0]
+                writer.writerow(values)
+                num += 1
+        # отметка уровня: последняя загруженная дата (при пустой выборке остаётся прежней)
+        if incremental:
+            self.state[f_name] = {'since': last_date if last_date is not None else since, 'query': digest}
+            self.save_state()
+        return num
@@ -15,6 +15,10 @@ $ python eve_sde_tools.py
 $ python story_of_eve_corp.py -i ./input -o ./output -v
 $ ffmpeg -i ./output/%05d.png -vf "scale=3840:2160,fps=24" out.mp4
 
+To encode the video without intermediate PNG files set RENDER_OUTPUT_MODE to
+RenderOutputMode.FFMPEG in render_settings.py, frames are piped into ffmpeg and
+the video is written to ./output/out.mp4 (see RENDER_FFMPEG_* settings).
+
 To add audio track into video stream run following commands:
 
 $ cat audiolist.txt
@@ -28,7 +32,9 @@ $ ffmpeg -i out.mp4 -i out-audio.mp3 -codec:v copy -codec:a copy -shortest outpu
 """
 import os
 import argparse
+from concurrent.futures import ProcessPoolExecutor
 import render
+import render_settings
 
 
 __version__ = '0.1.1'
@@ -37,7 +43,7 @@ __author__ = 'Qandra Si'
 
 def usage():
     '''Prints command line'''
-    print('Usage: story_of_eve_corp.py -i input_dir -o output_dir [-f] from_date [-t] to_date [-v]')
+    print('Usage: story_of_eve_corp.py -i input_dir -o output_dir [-f] from_date [-t] to_date [-j] jobs [--resume] [-v]')
 
 
 if __name__ == '__main__':
@@ -46,13 +52,33 @@ if __name__ == '__main__':
     parser.add_argument('-o', action="store", dest="outdir", help='Output directory for video frames')
     parser.add_argument('-f', action="store", dest="datefrom", help='Date from which processing should start')
     parser.add_argument('-t', action="store", dest="dateto", help='Date on which processing should be completed')
+    parser.add_argument('-j', '--jobs', action="store", dest="jobs", type=int, default=1, help='Number of processes rendering the frames')
+    parser.add_argument('--resume', action="store_true", dest="resume", help='Continue from the latest checkpoint in output directory')
     parser.add_argument('-v', action="store_true", dest="verbose", help='Verbose mode')
 
     args = parser.parse_args()
 
-    if not args.outdir or not args.inputdir:
+    if not args.outdir or not args.inputdir or args.jobs < 1:
         usage()
         exit(-1)
 
+    # ffmpeg пишет видео с начала и перезаписывает файл, поэтому продолжить рендеринг или разделить его на процессы
+    # в этом режиме нельзя (для этого есть режим CONTAINER и frames_export.py)
+    if render_settings.RENDER_OUTPUT_MODE == render_settings.RenderOutputMode.FFMPEG and (args.resume or args.jobs > 1):
+        print('Options --resume and --jobs are not supported with RENDER_OUTPUT_MODE = RenderOutputMode.FFMPEG, '
+              'use RenderOutputMode.CONTAINER and frames_export.py instead')
+        exit(-1)
+
     cwd: str = os.path.dirname(os.path.realpath(__file__))
-    render.render_base_image(cwd, args.inputdir, args.outdir, date_from=args.datefrom, date_to=args.dateto, verbose=args.verbose)
+    if args.jobs == 1:
+        render.render_base_image(cwd, args.inputdir, args.outdir, date_from=args.datefrom, date_to=args.dateto, verbose=args.verbose, resume=args.resume)
+    else:
+        # каждый процесс рисует свой отрезок дней, кадры нумеруются так же, как при рендеринге в одном процессе
+        with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+            futures = [executor.submit(
+                render.render_base_image,
+                cwd, args.inputdir, args.outdir,
+                date_from=args.datefrom, date_to=args.dateto, verbose=args.verbose,
+                job=job, jobs=args.jobs, resume=args.resume) for job in range(args.jobs)]
+            for f in futures:
+                f.result()
@@ -0,0 +1,105 @@
+import os
+import sys
+import types
+import sqlite3
+import tempfile
+import unittest
+
+ROOT: str = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# если render_settings.py ещё не создан, то используются настройки по умолчанию из render_settings.py.template
+try:
+    import render_settings
+except ImportError:
+    render_settings = types.ModuleType('render_settings')
+    with open(os.path.join(ROOT, 'render_settings.py.template'), 'rt', encoding='utf-8-sig') as f:
+        exec(compile(f.read(), 'render_settings.py.template', 'exec'), render_settings.__dict__)
+    sys.modules['render_settings'] = render_settings
+
+from render_source import DbSource
+
+
+SCHEMA: str = '''
+create table qview_employment_interval (main_pilot_id int, pilot_id int, main_pilot_name text, pilot_name text, enter_time text, gone_time text);
+create table killmail_victims (killmail_id int, character_id int, ship_type_id int);
+create table killmail_details (killmail_id int, killmail_time text, solar_system_id int);
+create table killmail_attackers (killmail_id int, character_id int, corporation_id int);
+create table invTypes (typeid int, typename text, mass real);
+create table esi_corporation_industry_jobs (ecj_start_date text, ecj_facility_id int);
+create table esi_known_stations (location_id int, solar_system_id int);
+create table corporation_wallet_transactions (corporation_id int, date text, location_id int, unit_price real, quantity int);
+create table universe_stations (station_id int, system_id int);
+create table universe_structures (structure_id int, solar_system_id int);
+create table corporation_wallet_journals (corporation_id int, date text, context_id int, ref_type text, amount real);
+create table character_minings (character_id int, date text, time text, solar_system_id int, quantity int);
+insert into invTypes values (670, 'Capsule', 32000.0), (17715, 'Gila', 9600000.0);
+insert into esi_known_stations values (1001, 30000142);
+insert into universe_stations values (60003760, 30000142);
+insert into universe_structures values (1035466617946, 30045352);
+'''
+
+
+def add_day(connection: sqlite3.Connection, day: int):
+    # за каждый день в БД появляются пилот, потери и убийства, работы, сделки, баунти и майнинг
+    dt: str = '2022-01-{:0>2} 12:00:00'.format(day)
+    connection.execute('insert into qview_employment_interval values (?,?,?,?,?,?)',
+                       (90000000 + day, 90000000 + day, 'Main {}'.format(day), 'Main {}'.format(day), dt,
+                        '2022-01-{:0>2} 12:00:00'.format(day + 1) if day % 4 == 0 else None))
+    connection.execute('insert into killmail_victims values (?,?,?)', (day, 90000000 + day, 17715))
+    connection.execute('insert into killmail_details values (?,?,?)', (day, '2022-01-{:0>2} 13:00:00'.format(day), 30000142))
+    connection.execute('insert into killmail_victims values (?,?,?)', (100 + day, 80000000, 670))
+    connection.execute('insert into killmail_details values (?,?,?)', (100 + day, '2022-01-{:0>2} 14:00:00'.format(day), 30045352))
+    connection.execute('insert into killmail_attackers values (?,?,?)', (100 + day, 90000000 + day, 98677876))
+    connection.execute('insert into esi_corporation_industry_jobs values (?,?)', (dt, 1001))
+    connection.execute('insert into corporation_wallet_transactions values (?,?,?,?,?)', (98677876, dt, 60003760, 1000.5, day))
+    connection.execute('insert into corporation_wallet_transactions values (?,?,?,?,?)', (98677876, dt, 1035466617946, 10.0, 3))
+    connection.execute('insert into corporation_wallet_journals values (?,?,?,?,?)', (98677876, dt, 30000142, 'bounty_prizes', 1234.5))
+    connection.execute('insert into character_minings values (?,?,?,?,?)', (90000000 + day, dt[:10], '13:00:00', 30000123, 100 * day))
+
+
+class TestDbSource(unittest.TestCase):
+    def setUp(self):
+        self.connection: sqlite3.Connection = sqlite3.connect(':memory:')
+        self.connection.executescript(SCHEMA)
+        self.queries = DbSource.read_queries(os.path.join(ROOT, 'input', 'example', 'queries-sqlite.sql'))
+        self.tmp = tempfile.TemporaryDirectory()
+        self.incremental_dir: str = os.path.join(self.tmp.name, 'incremental')
+        self.full_dir: str = os.path.join(self.tmp.name, 'full')
+        os.makedirs(self.incremental_dir)
+        os.makedirs(self.full_dir)
+
+    def tearDown(self):
+        self.connection.close()
+        self.tmp.cleanup()
+
+    def export(self, out_dir: str, full: bool) -> dict:
+        source: DbSource = DbSource(self.connection, sqlite3.paramstyle, self.queries, out_dir)
+        return {f_name: source.export(f_name, full) for f_name in self.queries.keys()}
+
+    def read(self, out_dir: str, f_name: str) -> str:
+        with open(os.path.join(out_dir, f_name), 'rt', encoding='utf8') as f:
+            return f.read()
+
+    def test_incremental_export_matches_full_export(self):
+        for day in range(1, 11):
+            add_day(self.connection, day)
+        self.export(self.incremental_dir, False)
+        # новые дни и запоздавшая строка за день, попадающий в INPUT_DB_OVERLAP_DAYS
+        for day in range(11, 13):
+            add_day(self.connection, day)
+        self.connection.execute('insert into corporation_wallet_transactions values (?,?,?,?,?)',
+                                (98677876, '2022-01-09 18:00:00', 1035466617946, 5.0, 1))
+        fetched = self.export(self.incremental_dir, False)
+        self.export(self.full_dir, True)
+        self.assertEqual(set(self.queries.keys()), {
+            'events-utf8.txt', 'killmails-utf8.txt', 'industry_jobs-utf8.txt', 'market-utf8.txt',
+            'employment_interval-utf8.txt', 'bounty_prizes-utf8.txt', 'mining-utf8.txt'})
+        for f_name in self.queries.keys():
+            self.assertEqual(self.read(self.incremental_dir, f_name), self.read(self.full_dir, f_name), f_name)
+        # инкрементально запрошены только последние дни (вместе с перекрытием), а не вся выгрузка
+        self.assertLess(fetched['market-utf8.txt'], len(self.read(self.full_dir, 'market-utf8.txt').splitlines()))
+        self.assertIn('2022-01-09\t30045352\t35\n', self.read(self.incremental_dir, 'market-utf8.txt'))
+
+
+if __name__ == '__main__':
+    unittest.main()